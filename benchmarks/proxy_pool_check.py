@@ -0,0 +1,257 @@
+"""
+Runs the ProxyPool against local dummy proxies.
+
+Starts a few HTTP proxies on localhost that answer every request the same way
+(fast, slow, 403, 503) plus a port that refuses connections, and sends the
+requests through SessionRequests._get, the path the API and HTML bots use, so
+the pool gets the same reports it would get in a real run. The quarantine runs
+on a VirtualClock, so the 30 minutes take no time. Nothing leaves the machine.
+Fails (exit code 1) if a check fails or if the real time spent is over the
+budget.
+
+    $ python benchmarks/proxy_pool_check.py --budget-s 10
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import urllib.request
+import urllib.error
+import argparse
+import threading
+import contextlib
+import collections
+import socket
+import pathlib
+import time
+import sys
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from craigslist_scraper.bots.session_requests import SessionRequests
+from craigslist_scraper.clock import VirtualClock, REAL_CLOCK
+from craigslist_scraper.metrics import JobMetrics
+from craigslist_scraper.proxy_pool import ProxyPool
+
+
+# The proxies answer every request themselves, so the target is never resolved
+TARGET_URL = 'http://boston.craigslist.invalid/search/ggg'
+
+# name: (status code, delay in seconds)
+DUMMY_PROXIES: dict[str, tuple[int, float]] = {
+    'fast': (200, 0),
+    'slow': (200, 0.05),
+    'blocked': (403, 0),
+    'broken': (503, 0),
+}
+
+
+class DummyProxyHandler(BaseHTTPRequestHandler):
+    """ Answers every proxied GET with the status code and delay of its server. """
+    def do_GET(self) -> None:
+        status, delay = self.server.behavior
+        time.sleep(delay)
+        body = b'{"data": {"items": []}}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class Response:
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
+
+
+class UrllibSession:
+    """ The part of a curl_cffi session that SessionRequests._get uses, over urllib. """
+    def get(self, url: str, impersonate: str = None, proxies: dict[str, str] = None, timeout: float = 5) -> Response:
+        opener = urllib.request.build_opener(urllib.request.ProxyHandler(proxies or {}))
+        try:
+            with opener.open(url, timeout=timeout) as resp:
+                return Response(resp.status, resp.read())
+        except urllib.error.HTTPError as e:
+            return Response(e.code, e.read())
+
+
+class Fetcher(SessionRequests):
+    """ A bot with one session that only sends requests. """
+    bot_type = 'check'
+    tls_fingerprint = None
+
+    def __init__(self, proxy_pool: ProxyPool):
+        self.session = UrllibSession()
+        self.metrics = JobMetrics()
+        self.proxy_pool = proxy_pool
+        # Latencies are real, the pool's quarantine times are virtual
+        self.clock = REAL_CLOCK
+
+    def fetch(self) -> bool:
+        """ Returns: Whether the request got a response. """
+        try:
+            self._get('check', TARGET_URL)
+            return True
+        except OSError:
+            return False
+
+
+@contextlib.contextmanager
+def dummy_proxies():
+    """ Yields: The url of every dummy proxy by name, including a 'refused' one. """
+    servers = {}
+    for name, behavior in DUMMY_PROXIES.items():
+        server = ThreadingHTTPServer(('127.0.0.1', 0), DummyProxyHandler)
+        server.behavior = behavior
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers[name] = server
+
+    # A port that was free a moment ago, so connecting to it is refused
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        refused_port = sock.getsockname()[1]
+
+    try:
+        urls = {name: f'http://127.0.0.1:{server.server_address[1]}' for name, server in servers.items()}
+        yield {**urls, 'refused': f'http://127.0.0.1:{refused_port}'}
+    finally:
+        for server in servers.values():
+            server.shutdown()
+            server.server_close()
+
+
+def proxy_of(pool: ProxyPool, url: str):
+    return next(proxy for proxy in pool.proxies if proxy.url == url)
+
+
+def check_stickiness(urls: dict[str, str], checks: list[tuple[str, bool]]) -> None:
+    """ A session keeps its proxy, and forgets it when it's released. """
+    pool = ProxyPool([urls['fast'], urls['slow']], clock=VirtualClock())
+    fetcher = Fetcher(pool)
+
+    used = set()
+    for _ in range(10):
+        fetcher.fetch()
+        used.add(pool.sticky[fetcher.proxy_session_key].url)
+
+    checks.append((f'a session sticks to one proxy ({len(used)} used)', len(used) == 1))
+
+    fetcher.release_proxy()
+    checks.append(('a released session is forgotten', fetcher.proxy_session_key not in pool.sticky))
+
+
+def check_quarantine(urls: dict[str, str], checks: list[tuple[str, bool]]) -> None:
+    """ Blocks quarantine a proxy at once, failures after max_consecutive_failures. """
+    clock = VirtualClock()
+    pool = ProxyPool(
+        [urls['blocked'], urls['broken'], urls['refused']],
+        quarantine_seconds=1800,
+        max_consecutive_failures=3,
+        clock=clock
+    )
+    blocked, broken, refused = (proxy_of(pool, urls[name]) for name in ('blocked', 'broken', 'refused'))
+
+    def fetch_through(proxy, times: int) -> None:
+        for _ in range(times):
+            fetcher = Fetcher(pool)
+            pool.sticky[fetcher.proxy_session_key] = proxy
+            fetcher.fetch()
+
+    now = clock.monotonic()
+    fetch_through(blocked, 1)
+    checks.append(('a 403 quarantines the proxy at once', blocked.is_quarantined(now) and blocked.blocks == 1))
+
+    fetch_through(broken, 2)
+    fetch_through(refused, 2)
+    checks.append((
+        'two failures in a row don\'t quarantine yet',
+        not broken.is_quarantined(now) and not refused.is_quarantined(now)
+    ))
+
+    fetch_through(broken, 1)
+    fetch_through(refused, 1)
+    checks.append((
+        'the third 503 and the third refused connection do',
+        broken.is_quarantined(now) and refused.is_quarantined(now)
+    ))
+
+    clock.sleep(1799)
+    checks.append(('the proxies stay quarantined for 30 minutes', all(
+        proxy.is_quarantined(clock.monotonic()) for proxy in pool.proxies
+    )))
+
+    clock.sleep(1)
+    checks.append(('and come back after them', not any(
+        proxy.is_quarantined(clock.monotonic()) for proxy in pool.proxies
+    )))
+
+
+def check_scoring(urls: dict[str, str], checks: list[tuple[str, bool]]) -> None:
+    """ New sessions prefer the fast proxy and leave the blocked one alone. """
+    pool = ProxyPool([urls['fast'], urls['slow'], urls['blocked']], clock=VirtualClock())
+    fast, slow, blocked = (proxy_of(pool, urls[name]) for name in ('fast', 'slow', 'blocked'))
+
+    # Warm up the latencies of both working proxies
+    for proxy in (fast, slow):
+        for _ in range(3):
+            fetcher = Fetcher(pool)
+            pool.sticky[fetcher.proxy_session_key] = proxy
+            fetcher.fetch()
+            fetcher.release_proxy()
+
+    checks.append((
+        f'the fast proxy scores higher ({fast.score():.0f} vs {slow.score():.0f})',
+        fast.score() > slow.score()
+    ))
+
+    picked = collections.Counter()
+    moved = 0
+    for _ in range(40):
+        fetcher = Fetcher(pool)
+        fetcher.fetch()
+        proxy = pool.sticky.get(fetcher.proxy_session_key)
+        picked[proxy.url if proxy is not None else None] += 1
+
+        # The blocked proxy is quarantined after its first request, and a session
+        # that had it gets another one for its next request
+        if proxy is blocked:
+            fetcher.fetch()
+            moved += pool.sticky[fetcher.proxy_session_key] is not blocked
+        fetcher.release_proxy()
+
+    checks.append((
+        f'new sessions pick the fast proxy most ({picked[fast.url]} fast, {picked[slow.url]} slow)',
+        picked[fast.url] > picked[slow.url]
+    ))
+    checks.append((
+        f'the blocked proxy is picked at most once ({picked[blocked.url]})',
+        picked[blocked.url] <= 1 and moved == picked[blocked.url]
+    ))
+    checks.append(('every session was released', not pool.sticky))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-s', type=float, default=10, help='Maximum real time in seconds')
+    args = parser.parse_args()
+
+    checks = []
+    start = time.perf_counter()
+
+    with dummy_proxies() as urls:
+        check_stickiness(urls, checks)
+        check_quarantine(urls, checks)
+        check_scoring(urls, checks)
+
+    real_time = time.perf_counter() - start
+    checks.append((f'took {real_time:.2f}s of real time (budget {args.budget_s:.0f}s)', real_time <= args.budget_s))
+
+    for name, ok in checks:
+        print(f'{"ok" if ok else "FAILED":>6}  {name}')
+
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
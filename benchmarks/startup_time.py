@@ -0,0 +1,88 @@
+"""
+Guards the cold-start time of the API-only path.
+
+Runs `python -X importtime` on the imports that `python scraper.py` does for an
+API run and fails (exit code 1) if they take longer than the budget, or if one
+of the heavy dependencies that only the fallback bots need gets imported.
+
+    $ python benchmarks/startup_time.py --budget-ms 250
+"""
+import argparse
+import subprocess
+import os
+import tempfile
+import pathlib
+import sys
+
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+STARTUP_CODE = 'from craigslist_scraper import Client; from craigslist_scraper.bots import APIBot'
+FORBIDDEN_MODULES = ('selenium', 'undetected_chromedriver', 'lxml', 'numpy')
+
+
+def measure_imports() -> list[tuple[str, int, int]]:
+    """
+    Run the startup code in a fresh interpreter with -X importtime.
+
+    Returns:
+        A list of (module name, nesting depth, cumulative import time in 
+        microseconds) in the order that -X importtime prints them.
+    """
+    # Run in an empty directory so the result doesn't depend on the current one. The
+    # repo is found through PYTHONPATH, and importing doesn't configure logging (the
+    # Client does that when it's created), so nothing is written.
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_CODE],
+            cwd=cwd,
+            env={**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [str(REPO_ROOT), os.environ.get('PYTHONPATH')]))},
+            capture_output=True,
+            text=True,
+            check=True
+        )
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line.removeprefix('import time:').split('|')
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        modules.append((name.strip(), depth, int(cumulative)))
+
+    return modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=250, help='Maximum import time in milliseconds')
+    parser.add_argument('--top', type=int, default=10, help='How many of the slowest imports to print')
+    args = parser.parse_args()
+
+    modules = measure_imports()
+    # Top level imports are not nested, so their cumulative times add up to the total.
+    total_ms = sum(us for _, depth, us in modules if depth == 0) / 1000
+
+    print(f'Total import time: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)')
+    for name, _, us in sorted(modules, key=lambda module: module[2], reverse=True)[:args.top]:
+        print(f'  {us / 1000:8.1f} ms  {name}')
+
+    failed = False
+    imported_forbidden = sorted({
+        name for name, _, _ in modules
+        if name.split('.')[0] in FORBIDDEN_MODULES
+    })
+    if imported_forbidden:
+        print(f'Imported modules that the API path should not need: {imported_forbidden}')
+        failed = True
+
+    if total_ms > args.budget_ms:
+        print('Over budget!')
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Runs the retry/backoff paths of the Client in virtual time.
+
+The bots are replaced with fakes that fail on cue, and the Client, the circuit
+breakers and the scheduler all get one VirtualClock, so the 100-300 second
+retry sleep, the 6 hour breaker cooldown and an hourly schedule take
+milliseconds. Fails (exit code 1) if a check fails or if the real time spent
+is over the budget, which is what happens if something still reads or sleeps
+on the real clock.
+
+    $ python benchmarks/virtual_backoff.py --budget-s 5
+"""
+import argparse
+import tempfile
+import pathlib
+import time
+import sys
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from craigslist_scraper import Client
+from craigslist_scraper.bots.bot_exceptions import BadRequestError
+from craigslist_scraper.clock import VirtualClock
+from craigslist_scraper.logger import configure_logger, stop_logger
+from craigslist_scraper.scheduler import Scheduler, ScheduledJob
+
+
+GIGS: list[dict[str, str | int]] = [
+    {'gig_id': 1, 'title': 'Focus group', 'comp_message': '$50', 'comp_estimate': 50},
+    {'gig_id': 2, 'title': 'Moving help', 'comp_message': '$25/hour', 'comp_estimate': 25},
+]
+
+
+class FakeSession:
+    def close(self) -> None:
+        pass
+
+
+class FakeBot:
+    """ Takes the arguments of a bot and fails the first "failures" times it's used. """
+    failures: int = 0
+    calls: int = 0
+    on_success = None
+
+    def __init__(self, location: str, search_path: str, metrics, clock, session=None, **kwargs):
+        self.metrics = metrics
+        self.clock = clock
+        self.session = session or FakeSession()
+
+    def get_all_gigs(self) -> list[dict[str, str | int]]:
+        FakeBot.calls += 1
+        with self.metrics.phase('fake_request'):
+            self.clock.sleep(1)
+
+        if FakeBot.calls <= FakeBot.failures:
+            raise BadRequestError(f'Fake bad request {FakeBot.calls}')
+
+        if FakeBot.on_success is not None:
+            FakeBot.on_success()
+        return [dict(gig) for gig in GIGS]
+
+
+def make_client(directory: pathlib.Path, clock: VirtualClock, failures: int) -> Client:
+    FakeBot.failures, FakeBot.calls, FakeBot.on_success = failures, 0, None
+    client = Client(str(directory / f'{failures}_failures.db'), clock=clock)
+    client.bots = dict.fromkeys(client.bots, FakeBot)
+    return client
+
+
+def check_retry_succeeds(directory: pathlib.Path, checks: list[tuple[str, bool]]) -> None:
+    """ A bad request, the long sleep and a retry that works. """
+    clock = VirtualClock()
+    client = make_client(directory, clock, failures=1)
+    job_id = client.run('boston', 'ggg', bot_type='api')
+
+    with client.db.connect() as conn:
+        phases = dict(conn.execute(
+            "select name, duration from job_metrics where job_id = ? and kind = 'phase';", (job_id,)
+        ).fetchall())
+    retry_sleep = phases['retry_sleep']
+
+    checks.append(('the retry stores the job', job_id is not None and FakeBot.calls == 2))
+    # gaussian_number_generator only bounds the sleep from below
+    checks.append((f'the retry slept at least 100s ({retry_sleep:.0f}s)', retry_sleep >= 100))
+    checks.append((
+        f'the scrape phase includes the sleeps ({phases["scrape"]:.0f}s)',
+        abs(phases['scrape'] - clock.total_slept) < 1
+    ))
+    checks.append(('the breaker closes again', client.selector.allows('api')))
+
+
+def check_breaker_cooldown(directory: pathlib.Path, checks: list[tuple[str, bool]]) -> None:
+    """ The retry fails too, the breaker opens and the cooldown passes. """
+    clock = VirtualClock()
+    client = make_client(directory, clock, failures=2)
+
+    try:
+        client.run('boston', 'ggg', bot_type='api')
+        failed = False
+    except BadRequestError:
+        failed = True
+
+    checks.append(('the failed retry raises', failed))
+    checks.append(('the breaker opens after the retry', 'api' not in client._plan('boston')))
+
+    clock.sleep(client.selector.cooldown - 1)
+    checks.append(('the breaker stays open during the cooldown', 'api' not in client._plan('boston')))
+
+    clock.sleep(1)
+    checks.append(('the breaker lets the bot try again after the cooldown', 'api' in client._plan('boston')))
+
+
+def check_schedule(directory: pathlib.Path, checks: list[tuple[str, bool]]) -> None:
+    """ An hourly job runs three times in about two hours of virtual time. """
+    clock = VirtualClock()
+    job = ScheduledJob('boston', 'ggg', interval=3600, jitter=0)
+    scheduler = Scheduler([job], db_file=str(directory / 'schedule.db'), clock=clock)
+    scheduler.client.bots = dict.fromkeys(scheduler.client.bots, FakeBot)
+
+    FakeBot.failures, FakeBot.calls = 0, 0
+    FakeBot.on_success = lambda: FakeBot.calls >= 3 and scheduler.stop()
+
+    start = clock.monotonic()
+    scheduler.run_forever()
+    elapsed = clock.monotonic() - start
+
+    checks.append((f'the job ran 3 times ({FakeBot.calls})', FakeBot.calls == 3))
+    checks.append((f'the runs were an hour apart ({elapsed:.0f}s)', 2 * 3600 <= elapsed < 2 * 3600 + 60))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-s', type=float, default=5, help='Maximum real time in seconds')
+    args = parser.parse_args()
+
+    checks = []
+    start = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        configure_logger(log_directory=str(directory / 'logs'))
+
+        check_retry_succeeds(directory, checks)
+        check_breaker_cooldown(directory, checks)
+        check_schedule(directory, checks)
+
+        stop_logger()
+
+    real_time = time.perf_counter() - start
+    checks.append((f'took {real_time:.2f}s of real time (budget {args.budget_s:.0f}s)', real_time <= args.budget_s))
+
+    for name, ok in checks:
+        print(f'{"ok" if ok else "FAILED":>6}  {name}')
+
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import threading
+import logging
+import hashlib
+import json
+import gzip
+import os
+
+from .bots.batch_parser import parse_batch
+from .db_manager import DBHandler
+from .clock import Clock, REAL_CLOCK
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseArchive:
+    """
+    A content-addressed store of raw API responses.
+
+    Every body is gzipped and saved as objects/<first 2 hex chars>/<sha256>.gz, 
+    so identical responses are only stored once and a file never changes after
+    it is written. Which job a response belongs to is recorded in the
+    raw_responses table (see JobArchive).
+    """
+    def __init__(self, directory: str = 'archive', compresslevel: int = 6):
+        """
+        Args:
+            directory: Where the archive lives. It is created if needed.
+            compresslevel: The gzip compression level.
+        """
+        self.directory: Path = Path(directory)
+        self.compresslevel: int = compresslevel
+
+    def path(self, sha256: str) -> Path:
+        return self.directory / 'objects' / sha256[:2] / f'{sha256}.gz'
+
+    def store(self, body: bytes) -> tuple[str, int]:
+        """
+        Args:
+            body: The raw response body.
+
+        Returns:
+            The sha256 of the body and the compressed size in bytes.
+        """
+        sha256 = hashlib.sha256(body).hexdigest()
+        path = self.path(sha256)
+
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            tmp_path.write_bytes(gzip.compress(body, compresslevel=self.compresslevel))
+            os.replace(tmp_path, path)
+
+        return sha256, path.stat().st_size
+
+    def load(self, sha256: str) -> bytes:
+        """ Returns: The raw body stored under sha256. """
+        return gzip.decompress(self.path(sha256).read_bytes())
+
+    def for_job(self, clock: Clock = None) -> 'JobArchive':
+        """ Returns: A JobArchive that stores into this archive, timestamped with the clock. """
+        return JobArchive(self, clock)
+
+
+class JobArchive:
+    """
+    Collects the responses archived during one job. The Client stores the 
+    entries in the raw_responses table once the job has an id.
+    """
+    def __init__(self, archive: ResponseArchive, clock: Clock = None):
+        """
+        Args:
+            archive: Where the bodies are stored.
+            clock: Where fetched_at comes from. Defaults to the real clock.
+
+        Attrs:
+            entries: One dict per archived response, in the order they were 
+                received.
+        """
+        self.archive: ResponseArchive = archive
+        self.clock: Clock = clock or REAL_CLOCK
+        self.entries: list[dict[str, str | int | float]] = []
+        self.lock = threading.Lock()
+
+    def store(self, endpoint: str, params: dict, body: bytes) -> None:
+        """
+        Args:
+            endpoint: Which endpoint the response came from ('full' or 'batch').
+            params: The query string parameters of the request.
+            body: The raw response body.
+        """
+        sha256, compressed_size = self.archive.store(body)
+
+        with self.lock:
+            self.entries.append({
+                'seq': len(self.entries),
+                'endpoint': endpoint,
+                'params': json.dumps(params, sort_keys=True),
+                'sha256': sha256,
+                'size': len(body),
+                'compressed_size': compressed_size,
+                'fetched_at': self.clock.time()
+            })
+
+    def clear(self) -> None:
+        """ Forget the responses of a failed attempt, so only the retry is linked to the job. """
+        with self.lock:
+            self.entries.clear()
+
+
+def _reparse_job(archive_directory: str, sha256s: list[str]) -> list[dict[str, str]]:
+    """ 
+    Worker process: parse the archived /batch bodies of one job. A gig that is in
+    more than one response (e.g. archives from before failed attempts were left
+    out) is only kept once, as in its last response.
+    """
+    archive = ResponseArchive(archive_directory)
+
+    gigs = {}
+    for sha256 in sha256s:
+        for gig in parse_batch(json.loads(archive.load(sha256))):
+            gigs[gig['gig_id']] = gig
+
+    return list(gigs.values())
+
+
+def reparse_archive(
+        db: DBHandler,
+        archive: ResponseArchive,
+        job_ids: list[int] = None,
+        workers: int = None
+    ) -> int:
+    """
+    Rebuild gig_data from the archived /batch responses, without any network
+    access. The jobs are parsed in parallel in worker processes and written by
+    this process.
+
+    Args:
+        db: The database to rebuild.
+        archive: Where the raw responses are.
+        job_ids: Only rebuild these jobs. Defaults to every job with archived responses.
+        workers: Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        The number of jobs rebuilt.
+    """
+    responses = db.get_raw_responses(endpoint='batch', job_ids=job_ids)
+    if not responses:
+        logger.warning('No archived /batch responses to parse')
+        return 0
+
+    logger.info(f'Parsing the archived responses of {len(responses)} jobs')
+    job_ids = list(responses)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            _reparse_job,
+            [str(archive.directory)] * len(job_ids),
+            [responses[job_id] for job_id in job_ids]
+        )
+
+        for job_id, gigs in zip(job_ids, results):
+            db.replace_job_gigs(job_id, gigs)
+            logger.info(f'Rebuilt job {job_id}: {len(gigs)} gigs')
+
+    return len(job_ids)
@@ -1,2 +1,20 @@
-from .api_bot import APIBot
-from .selenium_bot import SeleniumBot
\ No newline at end of file
+import importlib
+
+
+# The bots are imported on first use so that the API-only path never has to pay
+# for importing selenium, undetected_chromedriver or lxml.
+_BOT_MODULES: dict[str, str] = {
+    'APIBot': '.api_bot',
+    'HTMLBot': '.html_bot',
+    'SeleniumBot': '.selenium_bot',
+    'DetailFetcher': '.detail_fetcher',
+}
+
+__all__ = list(_BOT_MODULES)
+
+
+def __getattr__(name: str):
+    if name in _BOT_MODULES:
+        return getattr(importlib.import_module(_BOT_MODULES[name], __name__), name)
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
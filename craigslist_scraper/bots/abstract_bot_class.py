@@ -23,5 +23,9 @@ class CraigslistBot(ABC):
                 },
                 ...
             ]
+
+            The API bot also adds the "latitude" and "longitude" of the posting
+            (None if it has no location). The HTML bot adds the "details" it parsed
+            from the posting page (see HTMLBot.get_gig_data).
         """
         pass
\ No newline at end of file
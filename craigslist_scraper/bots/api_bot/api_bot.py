@@ -1,37 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import logging
 
 from curl_cffi import requests
 
-from craigslist_scraper.bots.utils import estimate_compensation, human_sleep_milliseconds
+from craigslist_scraper.bots.utils import human_sleep_milliseconds
+from craigslist_scraper.bots.batch_parser import parse_batch
 from craigslist_scraper.bots.abstract_bot_class import CraigslistBot
+from craigslist_scraper.bots.session_requests import SessionRequests
 from craigslist_scraper.bots.bot_exceptions import (
-    MismatchingAPIVersionError, BadRequestError)
+    MismatchingAPIVersionError, BadRequestError, UnsupportedLocationError)
+from craigslist_scraper.metrics import JobMetrics
+from craigslist_scraper.proxy_pool import ProxyPool
+from craigslist_scraper.archive import JobArchive
+from craigslist_scraper.search import Search
+from craigslist_scraper.clock import Clock, REAL_CLOCK
 
 
 logger = logging.getLogger(__name__)
 
 
-class APIBot(CraigslistBot):
+class APIBot(CraigslistBot, SessionRequests):
     """
     A class which uses Craigslist's private API the same way that the browser does.
-    The main method is get_public_gigs() which handles everything.
+    The main method is get_all_gigs() which handles everything. 
+    
+    The bot can scrape several searches (categories and filters) with one session:
+    the cookie is only initialized once and the /full requests of the searches
+    are sent in parallel. Use get_all_searches() to get the gigs per search.
 
     Class Attrs:
         REQUIRES_API_VERSION: The Craigslist API version (sent in the API responses). 
+        MAX_ERROR_BODY: How much of a bad response's body is kept in the BadRequestError.
+        LOCATION_CODES: The Craigslist area id of each location the bot can scrape.
     """
     REQUIRES_API_VERSION: int = 8
-
-    def __init__(self):
+    MAX_ERROR_BODY: int = 500
+    LOCATION_CODES: dict[str, int] = {'boston': 4, 'newyork': 3}
+
+    def __init__(
+            self,
+            location: str = 'boston',
+            search_path: str = 'ggg',
+            filters: dict[str, str] = None,
+            session: requests.Session = None,
+            metrics: JobMetrics = None,
+            proxy_pool: ProxyPool = None,
+            archive: JobArchive = None,
+            searches: list[Search] = None,
+            archives: dict[Search, JobArchive] = None,
+            search_metrics: dict[Search, JobMetrics] = None,
+            max_workers: int = 4,
+            clock: Clock = None
+        ):
         """
+        Args:
+            location: The Craigslist subdomain to scrape. Must be in LOCATION_CODES,
+                otherwise UnsupportedLocationError is raised.
+            search_path: The Craigslist category, e.g. 'ggg' for gigs. Ignored if
+                searches is given.
+            filters: The query string filters of the search (see Search). Ignored
+                if searches is given.
+            session: An already warm session to reuse (for example from a previous
+                run in daemon mode). A new one is created if this is None.
+            metrics: Where the phase and request timings are recorded.
+            proxy_pool: If set, every request goes through the session's proxy
+                from this pool.
+            archive: If set, the raw /full and /batch responses are archived here.
+            searches: The searches to scrape. Defaults to search_path with filters.
+            archives: A JobArchive per search, for when there are several searches
+                (each search is stored as its own job).
+            search_metrics: A JobMetrics per search for the requests and phases of
+                that search, for the same reason. The cookie, which all searches
+                share, is recorded in metrics.
+            max_workers: How many /full requests are sent at the same time.
+            clock: What the bot sleeps with. Defaults to the real clock.
+
         Attrs:
             param_cc: A query string parameter representing the country that the gigs are in.
             param_lang: A query string parameter establishing the language.
-            param_search_path: 'ggg' is for Craigslist Gigs.
-            param_is_paid: A query string parameter that affects the cacheId from the /full endpoint
-                and only returns paid gigs.
+            searches: See Args. The first one is used to get the cookie.
             location_code: The location code of the Craigslist Gigs. 4 is for boston and 3 is
-                for New York.
+                for New York (see LOCATION_CODES).
             batch_size: The default API result length (how many Gigs is returned per request).
             batch_sort_id: How the data is sorted.
             location: Used in the format-strings of some headers to create subdomains.
@@ -39,21 +89,30 @@ class APIBot(CraigslistBot):
                 of different browsers during the TLS handshake process.
             user_agent: A user agent that aligns with the TLS fingerprint.
             session: A curl_cffi session object; mainly to store cookies.
-            max_posted_ts: A timestamp that is returned from the /full endpoint.
-            cache_ts: Another timestamp returned from the /full endpoint.
-            cache_id: The CacheId value from the response of the /full endpoint.
-            gig_count: The total number of gigs for a location returned in the
-                response of the /.../full endpoint.
+            tokens: The tokens from the /full endpoint per search: max_posted_ts 
+                and cache_ts (timestamps), cache_id and gig_count (the total number
+                of gigs of the search).
+            metrics: See Args.
+            proxy_pool: See Args.
+            archives: See Args. A single archive is used for the first search.
+            search_metrics: See Args.
+            max_workers: See Args.
+            clock: See Args.
         """
         # Standard parameters for API requests
         self.param_cc: str = 'US'
         self.param_lang: str = 'en'
-        self.param_search_path: str = 'ggg'
-        self.param_is_paid: str = 'yes'
-        self.location_code: int = 4
+        if not APIBot.supports(location):
+            raise UnsupportedLocationError(
+                f'No Craigslist area id for {location!r} (known: {", ".join(APIBot.LOCATION_CODES)}). '
+                'Add it to APIBot.LOCATION_CODES or use another bot'
+            )
+
+        self.searches: list[Search] = searches or [Search(search_path, filters)]
+        self.location_code: int = APIBot.LOCATION_CODES[location]
         self.batch_size: int = 1080
         self.batch_sort_id: int = 1
-        self.location: str  = 'boston'
+        self.location: str  = location
 
         # Initializing session object defaults
         self.tls_fingerprint: str = 'safari15_5'
@@ -63,15 +122,29 @@ class APIBot(CraigslistBot):
             'Version/15.5 Safari/605.1.15'
         )
 
-        self.session = requests.Session()
+        self.session = session if session is not None else requests.Session()
 
         # Tokens that are set later
-        self.max_posted_ts: str = None
-        self.cache_ts: str = None
-        self.cache_id: str = None
+        self.tokens: dict[Search, dict[str, str | int]] = {}
+
+        self.bot_type: str = 'api'
+        self.clock: Clock = clock or REAL_CLOCK
+        self.metrics: JobMetrics = metrics if metrics is not None else JobMetrics(self.clock)
+        self.proxy_pool: ProxyPool = proxy_pool
+        self.archives: dict[Search, JobArchive] = archives or (
+            {self.searches[0]: archive} if archive is not None else {}
+        )
+        self.search_metrics: dict[Search, JobMetrics] = search_metrics or {}
+        self.max_workers: int = max_workers
 
-        # Other instance variables to be initialized later
-        self.gig_count: int = None
+    @staticmethod
+    def supports(location: str) -> bool:
+        """ Returns: True if the API bot can scrape the location (its area id is known). """
+        return location in APIBot.LOCATION_CODES
+
+    def metrics_for(self, search: Search) -> JobMetrics:
+        """ Returns: Where the requests and phases of a search are recorded. """
+        return self.search_metrics.get(search, self.metrics)
 
     def get_all_gigs(self) -> list[dict[str, str]]:
         """
@@ -80,26 +153,41 @@ class APIBot(CraigslistBot):
         and then sends a few requests in the same manner as a real browser.
 
         Returns:
-            More documentation about this in the abstract base class.
+            More documentation about this in the abstract base class. The gigs
+            of all the searches are returned together.
         """ 
+        return [gig for gigs in self.get_all_searches().values() for gig in gigs]
+
+    def get_all_searches(self) -> dict[Search, list[dict[str, str]]]:
+        """
+        Scrape every search with the same session.
+
+        Returns:
+            The gigs of each search (see the abstract base class), in the order 
+            of self.searches.
+        """
         self.initialize_session()
-        human_sleep_milliseconds(30, 200)
-        return self.gather_data()
+        human_sleep_milliseconds(30, 200, self.clock)
+        return {search: self.gather_data(search) for search in self.searches}
         
     def initialize_session(self) -> None:
         """ 
         Initializes the self.session request object 
-        and the instance variables from the /.../full endpoint.
+        and the tokens of every search from the /.../full endpoint.
         """
-        self.initialize_cookie()
+        with self.metrics.phase('cookie'):
+            self.initialize_cookie()
 
-        api_version: int = self.get_tokens_from_search_full_endpoint()
-        logger.info(f'Using Craigslist API version {api_version}')
+        with self.metrics.phase('full'), ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            api_versions = list(executor.map(self.get_tokens_from_search_full_endpoint, self.searches))
 
-        if api_version != APIBot.REQUIRES_API_VERSION:
-            raise MismatchingAPIVersionError(
-                f'API version {api_version}, but expected {APIBot.REQUIRES_API_VERSION}'
-            )
+        for api_version in set(api_versions):
+            logger.info(f'Using Craigslist API version {api_version}')
+
+            if api_version != APIBot.REQUIRES_API_VERSION:
+                raise MismatchingAPIVersionError(
+                    f'API version {api_version}, but expected {APIBot.REQUIRES_API_VERSION}'
+                )
 
     def initialize_cookie(self) -> None:
         """
@@ -116,27 +204,32 @@ class APIBot(CraigslistBot):
             "Sec-Fetch-Site": "same-site",
             'User-Agent': self.user_agent
         }
-        param = {'is_paid': self.param_is_paid}
-        url = f'https://{self.location}.craigslist.org/search/ggg'
+        param = self.searches[0].filters
+        url = f'https://{self.location}.craigslist.org/search/{self.searches[0].search_path}'
 
-        resp = self.session.get(url, impersonate=self.tls_fingerprint, headers=headers, params=param)
+        resp = self._get('cookie', url, headers=headers, params=param)
 
         logger.info(f'Sent request to base url get cookie. Status code: {resp.status_code}')
 
         if resp.status_code != 200 or 'cl_b' not in self.session.cookies:
             raise BadRequestError({
                 'status_code': resp.status_code,
-                'resp': resp.text,
+                'resp': resp.text[:APIBot.MAX_ERROR_BODY],
                 'session_cookies': self.session.cookies
             })
         
-        self.session.cookies.update({'cl_tocmode': 'ggg%3Apic'})
-        logger.debug(f'Initialized Session cookies: {self.session.cookies}')
+        self.session.cookies.update({
+            'cl_tocmode': '%2C'.join(f'{path}%3Apic' for path in dict.fromkeys(s.search_path for s in self.searches))
+        })
+        logger.debug('Initialized Session cookies: %s', self.session.cookies)
 
-    def get_tokens_from_search_full_endpoint(self) -> int:
+    def get_tokens_from_search_full_endpoint(self, search: Search) -> int:
         """
         Sends a request to the /.../full endpoint and then collects the necessary data
-        from the response to populate the rest of the instance variables..
+        from the response to populate self.tokens for the search. 
+
+        Args:
+            search: The search to get the tokens of.
 
         Returns:
             The Craigslist private API version number (int).
@@ -145,8 +238,8 @@ class APIBot(CraigslistBot):
             'CC': self.param_cc,
             'batch': f'{self.location_code}-{self.get_current_time()}-0-{self.batch_sort_id}-0',
             'lang': self.param_lang,
-            'searchPath': self.param_search_path,
-            'is_paid': self.param_is_paid
+            'searchPath': search.search_path,
+            **search.filters
         }
         headers = {
             "Accept": "*/*",
@@ -161,56 +254,63 @@ class APIBot(CraigslistBot):
         }
         url = 'https://sapi.craigslist.org/web/v8/postings/search/full' 
 
-        resp = self.session.get(url, impersonate=self.tls_fingerprint, params=params, headers=headers)
+        resp = self._get('full', url, metrics=self.metrics_for(search), params=params, headers=headers)
 
-        logger.info(f'Sent request to /.../full endpoint to get tokens. Status code: {resp.status_code}')
+        logger.info(f'Sent request to /.../full endpoint to get tokens of {search}. Status code: {resp.status_code}')
         if resp.status_code != 200:
             raise BadRequestError({
                 'status_code': resp.status_code,
-                'resp': resp.text,
+                'resp': resp.text[:APIBot.MAX_ERROR_BODY],
                 'session_cookies': self.session.cookies
             })
         
+        if search in self.archives:
+            self.archives[search].store('full', params, resp.content)
+
         data = resp.json()
         
-        self.cache_id = data['data']['cacheId']
-        self.cache_ts = data['data']['cacheTs']
-        self.max_posted_ts = data['data']['maxPostedTs']
-        self.gig_count = data['data']['totalResultCount']
+        tokens = {
+            'cache_id': data['data']['cacheId'],
+            'cache_ts': data['data']['cacheTs'],
+            'max_posted_ts': data['data']['maxPostedTs'],
+            'gig_count': data['data']['totalResultCount']
+        }
+        self.tokens[search] = tokens
 
-        logger.debug(f''' Collected tokens: 
-            {self.cache_id = } 
-            {self.cache_ts = } 
-            {self.max_posted_ts = } 
-            {self.gig_count = }''')
+        logger.debug('Collected tokens of %s: %r', search, tokens)
 
         return data.get('apiVersion', '-1')
     
-    def gather_data(self) -> list[dict[str, str]]:
+    def gather_data(self, search: Search) -> list[dict[str, str]]:
         """
         Handles the task of calling the method to get the data.
         If the batch-size is say 1080 but the gig-count is 2000, 
         this is the method that would handle sending two requests to 
         the /.../batch endpoint to retrieve all of the data.
 
+        Args:
+            search: The search to get the gigs of.
+
         Returns:
             More documentation about this in the abstract base class.
         """
         data = []
 
-        for i in range(0, self.gig_count, self.batch_size):
-            gigs = self.get_batch_data(i, self.batch_size)
+        for i in range(0, self.tokens[search]['gig_count'], self.batch_size):
+            with self.metrics_for(search).phase('batch', detail=f'{search} start={i} count={self.batch_size}'):
+                gigs = self.get_batch_data(search, i, self.batch_size)
             data.extend(gigs)
-            human_sleep_milliseconds(5, 20)
+            human_sleep_milliseconds(5, 20, self.clock)
             
         return data
 
 
-    def get_batch_data(self, start: int, count: int) -> list[dict[str, str]]:
+    def get_batch_data(self, search: Search, start: int, count: int) -> list[dict[str, str]]:
         """
         Send a request to /.../batch API endpoint and get some gigs.
 
         Args:
+            search: The search (whose tokens are used).
             start: This is the first gig that will be returned. 
             count: This is the number of gigs that will be returned;
                 generally, this should be self.batch_size.
@@ -218,11 +318,12 @@ class APIBot(CraigslistBot):
         Returns:
             More documentation about this in the abstract base class.
         """
-        logger.info(f'Sending request to /../batch endpoint to get data. Gigs: {start = } {count = }')
+        logger.info(f'Sending request to /../batch endpoint to get data of {search}. Gigs: {start = } {count = }')
 
+        tokens = self.tokens[search]
         params = {
-            'batch': f'{self.location_code}-{start}-{count}-1-0-{self.max_posted_ts}-{self.cache_ts}',
-            'cacheId': self.cache_id,
+            'batch': f'{self.location_code}-{start}-{count}-1-0-{tokens["max_posted_ts"]}-{tokens["cache_ts"]}',
+            'cacheId': tokens['cache_id'],
             'CC': self.param_lang,
             'lang':self.param_lang,
         }
@@ -239,27 +340,21 @@ class APIBot(CraigslistBot):
         }
         url = 'https://sapi.craigslist.org/web/v8/postings/search/batch'
 
-        resp = self.session.get(url, impersonate=self.tls_fingerprint, params=params, headers=headers)
+        resp = self._get('batch', url, metrics=self.metrics_for(search), params=params, headers=headers)
 
         logger.info(f'Sent request to /.../batch endpoint. Status code: {resp.status_code}')
         if resp.status_code != 200:
             raise BadRequestError({
                 'status_code': resp.status_code,
-                'resp': resp.text,
+                'resp': resp.text[:APIBot.MAX_ERROR_BODY],
                 'session_cookies': self.session.cookies
             })
 
-        data = resp.json()
-        base_id = int(data['data']['minPostingId'])
-
-        gigs = []
-        for posting in data['data']['batch']:
-            gigs.append({
-                'gig_id': int(posting[0]) + base_id,
-                'title': posting[1],
-                'comp_message': '$0' if len(posting) < 5 else posting[4][1],
-                'comp_estimate': estimate_compensation('$0' if len(posting) < 5 else posting[4][1]) 
-            })
+        if search in self.archives:
+            self.archives[search].store('batch', params, resp.content)
+
+        with self.metrics_for(search).phase('parse', detail=f'{search} start={start} count={count}'):
+            gigs = parse_batch(resp.json())
 
         return gigs
 
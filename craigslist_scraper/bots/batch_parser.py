@@ -0,0 +1,33 @@
+from craigslist_scraper.bots.utils import estimate_compensation
+from craigslist_scraper.geo import parse_coordinates
+
+
+def parse_batch(data: dict) -> list[dict[str, str]]:
+    """
+    Turn the JSON of a v8 /.../batch response into gigs.
+
+    This is kept apart from the APIBot so that archived responses can be parsed
+    again offline without importing the network code.
+
+    Args:
+        data: The decoded JSON body of a /.../batch response.
+
+    Returns:
+        A list of gigs (more documentation about this in the abstract base class).
+    """
+    base_id = int(data['data']['minPostingId'])
+
+    gigs = []
+    for posting in data['data']['batch']:
+        comp_message = '$0' if len(posting) < 5 else posting[4][1]
+        latitude, longitude = parse_coordinates(posting)
+        gigs.append({
+            'gig_id': int(posting[0]) + base_id,
+            'title': posting[1],
+            'comp_message': comp_message,
+            'comp_estimate': estimate_compensation(comp_message),
+            'latitude': latitude,
+            'longitude': longitude
+        })
+
+    return gigs
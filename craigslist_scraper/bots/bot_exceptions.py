@@ -28,7 +28,18 @@ class BadRequestError(APIBotError):
     """ A generic bad request exception. """
     pass
 
+class UnsupportedLocationError(APIBotError):
+    """ The API bot doesn't know the area id of this location. Add it to APIBot.LOCATION_CODES. """
+    pass
+
 class UnableToGetToPageError(SeleniumBotError):
     """ Unable to get to next page. You are probably blocked. Change proxy? """
     pass
 
+class HTMLBotError(BotError):
+    """ An error originating from the browserless HTML bot. """
+    pass
+
+class UnableToParsePageError(HTMLBotError):
+    """ The page did not have the expected markup. Did Craigslist change its HTML? """
+    pass
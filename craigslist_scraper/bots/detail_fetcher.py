@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+from curl_cffi import requests
+from lxml import html
+
+from craigslist_scraper.bots.utils import human_sleep_milliseconds
+from craigslist_scraper.bots.session_requests import SessionRequests
+from craigslist_scraper.bots.bot_exceptions import BadRequestError, UnableToParsePageError
+from craigslist_scraper.bots.xpaths import XPATH_POSTING_BODY, XPATH_NEIGHBORHOOD, XPATH_POSTED_DATE
+from craigslist_scraper.metrics import JobMetrics
+from craigslist_scraper.proxy_pool import ProxyPool
+from craigslist_scraper.clock import Clock, REAL_CLOCK
+
+
+logger = logging.getLogger(__name__)
+
+
+class DetailFetcher(SessionRequests):
+    """
+    Fetches the posting pages of gigs to get what the search results don't have:
+    the body of the posting, the neighborhood and the date it was posted. The pages
+    are fetched in parallel with a bounded thread pool. The Client decides which
+    gigs need their details (new gigs and gigs whose title or compensation changed).
+
+    Class Attrs:
+        DETAIL_URL: The default url template of a posting page. Craigslist redirects
+            this short form to the full posting url.
+        GONE_STATUS_CODES: The status codes of a deleted or expired posting.
+    """
+    DETAIL_URL: str = 'https://{location}.craigslist.org/{search_path}/{gig_id}.html'
+    GONE_STATUS_CODES: tuple[int, ...] = (404, 410)
+
+    def __init__(
+            self,
+            location: str = 'boston',
+            search_path: str = 'ggg',
+            session: requests.Session = None,
+            max_workers: int = 4,
+            url_template: str = None,
+            metrics: JobMetrics = None,
+            proxy_pool: ProxyPool = None,
+            clock: Clock = None
+        ):
+        """
+        Args:
+            location: The Craigslist subdomain of the gigs.
+            search_path: The Craigslist category of the gigs.
+            session: An already warm session to reuse. A new one is created if
+                this is None.
+            max_workers: How many posting pages to fetch at the same time.
+            url_template: The url of a posting page, formatted with location,
+                search_path and gig_id. Defaults to DETAIL_URL.
+            metrics: Where the request timings are recorded.
+            proxy_pool: If set, every request goes through the session's proxy
+                from this pool.
+            clock: What the fetcher sleeps with. Defaults to the real clock.
+
+        Attrs:
+            tls_fingerprint: The browser that curl_cffi mimics during the TLS handshake.
+            user_agent: A user agent that aligns with the TLS fingerprint.
+            session: A curl_cffi session object; mainly to store cookies.
+            The rest: See Args.
+        """
+        self.location: str = location
+        self.search_path: str = search_path
+        self.max_workers: int = max_workers
+        self.url_template: str = url_template or DetailFetcher.DETAIL_URL
+
+        self.tls_fingerprint: str = 'safari15_5'
+        self.user_agent = (
+            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
+            'AppleWebKit/605.1.15 (KHTML, like Gecko) '
+            'Version/15.5 Safari/605.1.15'
+        )
+
+        self.session = session if session is not None else requests.Session()
+        self.bot_type: str = 'details'
+        self.clock: Clock = clock or REAL_CLOCK
+        self.metrics: JobMetrics = metrics if metrics is not None else JobMetrics(self.clock)
+        self.proxy_pool: ProxyPool = proxy_pool
+
+    def fetch_all(self, gigs: list[dict[str, int]]) -> list[dict[str, str | int | float]]:
+        """
+        Fetch the details of many gigs in parallel. A posting that was deleted gets
+        a tombstone (see fetch()). One that can't be fetched or parsed for another
+        reason is logged and left out, so it is tried again next time.
+
+        Args:
+            gigs: [{gig_id, content_hash}, ...]
+
+        Returns:
+            The details and tombstones of the gigs that worked (see fetch()).
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='details') as executor:
+            results = list(executor.map(self._fetch_or_none, gigs))
+
+        details = [result for result in results if result is not None]
+        gone = sum(detail['gone_at'] is not None for detail in details)
+        logger.info(f'Fetched the details of {len(details) - gone} of {len(gigs)} gigs, {gone} postings were gone')
+        return details
+
+    def _fetch_or_none(self, gig: dict[str, int]) -> dict[str, str | int | float] | None:
+        try:
+            return self.fetch(gig)
+
+        except (BadRequestError, UnableToParsePageError) as e:
+            logger.warning(f'Could not get the details of gig {gig["gig_id"]}: {e}')
+
+        except Exception as e:
+            logger.error(e, exc_info=e)
+
+        return None
+
+    def fetch(self, gig: dict[str, int]) -> dict[str, str | int | float]:
+        """
+        Fetch and parse the posting page of one gig.
+
+        Args:
+            gig: {gig_id, content_hash}. The content hash is stored with the details
+                so that they are only fetched again when the gig changes.
+
+        Returns:
+            {gig_id, content_hash, body, neighborhood, posted_at, fetched_at, gone_at}
+            If the posting is gone (GONE_STATUS_CODES), this is a tombstone: gone_at
+            is the time and the details are None, so it isn't fetched again until
+            the gig changes.
+        """
+        human_sleep_milliseconds(50, 400, self.clock)
+
+        url = self.url_template.format(location=self.location, search_path=self.search_path, gig_id=gig['gig_id'])
+        headers = {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9",
+            "Accept-Encoding": "gzip, deflate, br",
+            "Accept-Language": "en-US,en;q=0.9",
+            "Referer": f"https://{self.location}.craigslist.org/search/{self.search_path}",
+            "Sec-Fetch-Dest": "document",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-Site": "same-origin",
+            'User-Agent': self.user_agent
+        }
+
+        resp = self._get('detail', url, headers=headers)
+        logger.debug('Sent request to %s. Status code: %s', url, resp.status_code)
+        if resp.status_code in DetailFetcher.GONE_STATUS_CODES:
+            logger.info(f'The posting of gig {gig["gig_id"]} is gone ({resp.status_code})')
+            now = self.clock.time()
+            return {
+                'gig_id': gig['gig_id'],
+                'content_hash': gig['content_hash'],
+                'body': None,
+                'neighborhood': None,
+                'posted_at': None,
+                'fetched_at': now,
+                'gone_at': now
+            }
+
+        if resp.status_code != 200:
+            raise BadRequestError({'status_code': resp.status_code, 'url': url})
+
+        body, neighborhood, posted_at = self.parse_detail_page(html.fromstring(resp.content, base_url=url), url)
+
+        return {
+            'gig_id': gig['gig_id'],
+            'content_hash': gig['content_hash'],
+            'body': body,
+            'neighborhood': neighborhood,
+            'posted_at': posted_at,
+            'fetched_at': self.clock.time(),
+            'gone_at': None
+        }
+
+    @staticmethod
+    def parse_detail_page(tree: html.HtmlElement, url: str) -> tuple[str, str | None, str | None]:
+        """
+        Pull the body, neighborhood and posted date out of a posting page.
+
+        Args:
+            tree: The parsed posting page.
+            url: The url of the posting (for the error message).
+
+        Returns:
+            tuple(body text, neighborhood or None, posted date (ISO 8601) or None)
+        """
+        body_elements = tree.xpath(XPATH_POSTING_BODY)
+        if not body_elements:
+            raise UnableToParsePageError(f'Could not find the posting body on {url}')
+
+        # The body starts with a hidden "QR Code Link to This Post" block
+        for element in body_elements[0].xpath(".//*[contains(@class, 'print-qrcode')]"):
+            element.drop_tree()
+        body = body_elements[0].text_content().strip()
+
+        neighborhood_elements = tree.xpath(XPATH_NEIGHBORHOOD)
+        neighborhood = neighborhood_elements[-1].text_content().strip(' ()\n') if neighborhood_elements else None
+
+        posted = tree.xpath(XPATH_POSTED_DATE)
+        posted_at = str(posted[0]) if posted else None
+
+        return body, neighborhood or None, posted_at
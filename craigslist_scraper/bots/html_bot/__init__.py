@@ -0,0 +1 @@
+from .html_bot import HTMLBot
\ No newline at end of file
@@ -0,0 +1,284 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urljoin
+import logging
+import re
+
+from curl_cffi import requests
+from lxml import html
+
+from craigslist_scraper.bots.utils import estimate_compensation, human_sleep_milliseconds
+from craigslist_scraper.bots.abstract_bot_class import CraigslistBot
+from craigslist_scraper.bots.session_requests import SessionRequests
+from craigslist_scraper.bots.detail_fetcher import DetailFetcher
+from craigslist_scraper.bots.bot_exceptions import BadRequestError, UnableToParsePageError
+from craigslist_scraper.bots.xpaths import (
+    XPATH_COMP, XPATH_TITLE, XPATH_STATIC_RESULTS, XPATH_STATIC_GIG_LINKS, XPATH_STATIC_NEXT_PAGE
+)
+from craigslist_scraper.metrics import JobMetrics
+from craigslist_scraper.proxy_pool import ProxyPool
+from craigslist_scraper.clock import Clock, REAL_CLOCK
+from craigslist_scraper.search import Search
+
+
+logger = logging.getLogger(__name__)
+
+
+class HTMLBot(CraigslistBot, SessionRequests):
+    """
+    A browserless scraper for Craigslist's server-rendered HTML pages.
+
+    It sits between the APIBot and the SeleniumBot: it requests the same pages
+    that the SeleniumBot drives Chrome through, but with a curl_cffi session (so
+    the TLS fingerprint still looks like a real browser) and parses them with lxml
+    using the same XPaths as the Selenium mixins. Posting pages are fetched
+    concurrently since there is no browser state to keep in order. The details
+    of the postings (see DetailFetcher) are parsed from the same pages, so the
+    Client doesn't have to fetch them again.
+
+    Class Attrs:
+        MAX_SEARCH_PAGES: The most search result pages that are followed.
+    """
+    MAX_SEARCH_PAGES: int = 25
+
+    def __init__(
+            self,
+            location: str = 'boston',
+            search_path: str = 'ggg',
+            filters: dict[str, str] = None,
+            session: requests.Session = None,
+            max_workers: int = 4,
+            metrics: JobMetrics = None,
+            proxy_pool: ProxyPool = None,
+            clock: Clock = None
+        ):
+        """
+        Args:
+            location: The Craigslist subdomain to scrape.
+            search_path: The Craigslist category, e.g. 'ggg' for gigs.
+            filters: Query string parameters of the search page. Defaults to
+                the default filters of the category (see Search).
+            session: An already warm session to reuse. A new one is created if
+                this is None.
+            max_workers: How many posting pages to fetch at the same time.
+            metrics: Where the phase and request timings are recorded.
+            proxy_pool: If set, every request goes through the session's proxy
+                from this pool.
+            clock: What the bot sleeps with. Defaults to the real clock.
+
+        Attrs:
+            param_search_path: The category. 'ggg' is for Craigslist Gigs.
+            filters: See Args.
+            location: Used to build the subdomain of the urls.
+            max_workers: Size of the thread pool used for the posting pages.
+            tls_fingerprint: The browser that curl_cffi mimics during the TLS handshake.
+            user_agent: A user agent that aligns with the TLS fingerprint.
+            session: A curl_cffi session object; mainly to store cookies.
+            metrics: See Args.
+            proxy_pool: See Args.
+            clock: See Args.
+        """
+        self.param_search_path: str = search_path
+        self.filters: dict[str, str] = Search(search_path, filters).filters
+        self.location: str = location
+        self.max_workers: int = max_workers
+
+        self.tls_fingerprint: str = 'safari15_5'
+        self.user_agent = (
+            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
+            'AppleWebKit/605.1.15 (KHTML, like Gecko) '
+            'Version/15.5 Safari/605.1.15'
+        )
+
+        self.session = session if session is not None else requests.Session()
+        self.bot_type: str = 'html'
+        self.clock: Clock = clock or REAL_CLOCK
+        self.metrics: JobMetrics = metrics if metrics is not None else JobMetrics(self.clock)
+        self.proxy_pool: ProxyPool = proxy_pool
+
+    @property
+    def base_url(self) -> str:
+        return f'https://{self.location}.craigslist.org/search/{self.param_search_path}'
+
+    def get_all_gigs(self) -> list[dict[str, str]]:
+        """
+        Load the search page, collect the links to every posting and then
+        scrape the postings in parallel.
+
+        Returns:
+            More documentation about this in the abstract base class.
+        """
+        with self.metrics.phase('search_page'):
+            links = self.get_gig_links()
+        logger.info(f'Found {len(links)} gigs on the search page')
+
+        with self.metrics.phase('postings'), ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self._get_gig_data_or_none, links))
+
+        data = [gig for gig in results if gig is not None]
+        if not data:
+            raise UnableToParsePageError(f'Could not scrape any of the {len(links)} postings')
+
+        if len(data) < len(links):
+            logger.warning(f'Skipped {len(links) - len(data)} of {len(links)} postings')
+        return data
+
+    def _get_gig_data_or_none(self, url: str) -> dict[str, str] | None:
+        """ One posting that can't be fetched or parsed shouldn't lose all the others. """
+        try:
+            return self.get_gig_data(url)
+
+        except (BadRequestError, UnableToParsePageError) as e:
+            logger.warning(f'Could not scrape the posting {url}: {e}')
+
+        except Exception as e:
+            logger.error(e, exc_info=e)
+
+        return None
+
+    def get_gig_links(self) -> list[str]:
+        """
+        Get the url of every gig listed on the (non-Javascript) search pages,
+        following the next page links.
+
+        Returns:
+            A list of absolute posting urls without duplicates, in page order.
+
+        Raises:
+            UnableToParsePageError: If a page has no results list (a block page, a
+                captcha or a change in the markup) or the search has no gigs at 
+                all. An empty job would look like every gig had been removed.
+        """
+        headers = {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9",
+            "Accept-Encoding": "gzip, deflate, br",
+            "Accept-Language": "en-US,en;q=0.9",
+            "Host": f"{self.location}.craigslist.org",
+            "Referer": "https://www.google.com/",
+            "Sec-Fetch-Dest": "document",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-Site": "cross-site",
+            'User-Agent': self.user_agent
+        }
+        links = {}
+        url, params = self.base_url, self.filters
+        seen = set()
+
+        for _ in range(HTMLBot.MAX_SEARCH_PAGES):
+            seen.add(url)
+            tree = self.get_page('search_page', url, headers=headers, params=params)
+            if not tree.xpath(XPATH_STATIC_RESULTS):
+                raise UnableToParsePageError(f'Could not find the search results on {url}')
+
+            links.update(dict.fromkeys(urljoin(url, href) for href in tree.xpath(XPATH_STATIC_GIG_LINKS)))
+
+            next_pages = [urljoin(url, href) for href in tree.xpath(XPATH_STATIC_NEXT_PAGE)]
+            if not next_pages or next_pages[0] in seen:
+                break
+
+            # The next page link already has the filters in it
+            url, params = next_pages[0], None
+            human_sleep_milliseconds(50, 400, self.clock)
+
+        else:
+            logger.warning(f'Stopped after {HTMLBot.MAX_SEARCH_PAGES} search pages of {self.base_url}')
+
+        if not links:
+            raise UnableToParsePageError(f'Could not find any gigs on the search page of {self.base_url}')
+
+        return list(links)
+
+    def get_gig_data(self, url: str) -> dict[str, str]:
+        """
+        Scrape a single posting page.
+
+        Args:
+            url: The url of the posting.
+
+        Returns:
+            One gig in the format documented in the abstract base class, with the
+            "details" of the posting: {body, neighborhood, posted_at, fetched_at},
+            or None if the page has no posting body.
+        """
+        human_sleep_milliseconds(50, 400, self.clock)
+
+        headers = {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9",
+            "Accept-Encoding": "gzip, deflate, br",
+            "Accept-Language": "en-US,en;q=0.9",
+            "Host": urlparse(url).netloc,
+            "Referer": self.base_url,
+            "Sec-Fetch-Dest": "document",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-Site": "same-origin",
+            'User-Agent': self.user_agent
+        }
+        tree = self.get_page('posting', url, headers=headers)
+        title, comp, gig_id = self.parse_gig_page(tree, url)
+
+        try:
+            body, neighborhood, posted_at = DetailFetcher.parse_detail_page(tree, url)
+            details = {
+                'body': body,
+                'neighborhood': neighborhood,
+                'posted_at': posted_at,
+                'fetched_at': self.clock.time()
+            }
+        except UnableToParsePageError:
+            details = None
+
+        logger.info(f'Scraped gig: "{title}"')
+        return {
+            'gig_id': gig_id,
+            'title': title,
+            'comp_message': comp,
+            'comp_estimate': estimate_compensation(comp),
+            'details': details
+        }
+
+    def get_page(self, name: str, url: str, **kwargs) -> html.HtmlElement:
+        """
+        GET a page and parse it into an lxml tree.
+
+        Args:
+            name: What the request is for ('search_page' or 'posting').
+            url: The page to get.
+            **kwargs: Passed on to session.get().
+
+        Returns:
+            The root element of the page.
+        """
+        resp = self._get(name, url, **kwargs)
+
+        logger.debug('Sent request to %s. Status code: %s', url, resp.status_code)
+        if resp.status_code != 200:
+            raise BadRequestError({
+                'status_code': resp.status_code,
+                'url': url,
+                'session_cookies': self.session.cookies
+            })
+
+        return html.fromstring(resp.content, base_url=url)
+
+    @staticmethod
+    def parse_gig_page(tree: html.HtmlElement, url: str) -> tuple[str, str, int]:
+        """
+        Pull the title, compensation and gig id out of a posting page.
+
+        Args:
+            tree: The parsed posting page.
+            url: The url of the posting; the gig id is part of the path.
+
+        Returns:
+            tuple(title text, compensation text, gig id from url)
+        """
+        title_elements = tree.xpath(XPATH_TITLE)
+        comp_elements = tree.xpath(XPATH_COMP)
+        gig_id = re.search(r'\/(\d+)\.html', urlparse(url).path)
+
+        if not title_elements or gig_id is None:
+            raise UnableToParsePageError(f'Could not find the gig title or id on {url}')
+
+        title = title_elements[0].text_content().strip()
+        comp = comp_elements[0].text_content().strip() if comp_elements else '$0'
+
+        return title, comp, int(gig_id.group(1))
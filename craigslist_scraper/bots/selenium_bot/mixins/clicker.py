@@ -2,8 +2,6 @@ from __future__ import annotations
 
 import logging
 
-import undetected_chromedriver as uc
-
 from craigslist_scraper.bots.bot_exceptions import UnableToGetToPageError
 from craigslist_scraper.bots.utils import human_sleep_seconds
 
@@ -17,6 +15,10 @@ logger = logging.getLogger(__name__)
 
 
 class Clicker:
+    """ 
+    Expects the bot to have these attributes: driver and clock, and the 
+    create_driver, load_page and report_page methods.
+    """
     def get_to_page(self, element: WebElement, get_to: str = None):
         """
         Attempt to get to another page by using four different methods.
@@ -39,42 +41,44 @@ class Clicker:
 
         except Exception as e:
             logger.exception(e)
-            human_sleep_seconds(40, 120)
+            human_sleep_seconds(40, 120, self.clock)
         
         else:
             if self.check_new_page(old_url, get_to): 
                 logger.info('Successful click via method 1!')
+                self.report_page(ok=True)
                 return 
         
         logger.error('Failed to click on element with element.click()')
-        human_sleep_seconds(5, 7)
+        human_sleep_seconds(5, 7, self.clock)
 
         try:
             self.driver.execute_script("arguments[0].click();", element)
         
         except Exception as e:
             logger.exception(e)
-            human_sleep_seconds(40, 120)
+            human_sleep_seconds(40, 120, self.clock)
         
         else:
             if self.check_new_page(old_url, get_to): 
                 logger.info('Successful click via method 2!')
+                self.report_page(ok=True)
                 return 
 
         logger.error('Failed to click on element with Javascript')
 
         if get_to:
-            human_sleep_seconds(5, 10)
-            self.driver.load_page(get_to)
+            human_sleep_seconds(5, 10, self.clock)
+            self.load_page(get_to)
             if self.check_new_page(old_url, get_to): 
                 logger.info('Successful click via method 3!')
                 return 
 
             logger.critical('Unable to get to url. Restarting WebDriver')
-            human_sleep_seconds(120, 240)
+            human_sleep_seconds(120, 240, self.clock)
 
             self.driver.quit()
-            self.driver = uc.Chrome(headless=True)
+            self.driver = self.create_driver()
             self.load_page(get_to)
 
             if self.check_new_page(old_url, get_to): 
@@ -6,6 +6,8 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+from craigslist_scraper.bots.xpaths import XPATH_COMP, XPATH_TITLE
+
 
 logger = logging.getLogger(__name__)
 
@@ -19,9 +21,6 @@ class GetGigData:
         Returns:
             tuple(title text, compensation text, gig id from url)
         """
-        XPATH_COMP = "(//p|//span)[contains(text(), 'compensation')]/b" 
-        XPATH_TITLE = "//*[@id='titletextonly']"
-
         comp_element = WebDriverWait(self.driver, 10).until(
             EC.presence_of_element_located((By.XPATH, XPATH_COMP))
         )
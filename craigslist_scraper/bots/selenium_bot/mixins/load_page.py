@@ -1,4 +1,5 @@
 import logging
+
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 
@@ -14,10 +15,14 @@ class LoadPage:
         Args:
             url: The url for driver.get(HERE).
         """
+        start = self.clock.monotonic()
         self.driver.get(url)
 
         wait = WebDriverWait(self.driver, 15)
         wait.until(
             lambda driver: driver.execute_script('return document.readyState') == 'complete'
         )
+        duration = self.clock.monotonic() - start
+        self.metrics.record_request('page', url, 'selenium', duration=duration)
+        self.report_page(ok=True, latency=duration)
         logger.info(f'Loaded page: {url}')
\ No newline at end of file
@@ -5,6 +5,8 @@ from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 
+from craigslist_scraper.bots.xpaths import XPATH_FIRST_GIG, XPATH_NEXT_PAGE_BTN
+
 
 logger = logging.getLogger(__name__)
 
@@ -12,7 +14,6 @@ logger = logging.getLogger(__name__)
 class NavigateSite:
     def navigate_to_first_gig(self) -> None:
         """ Get to the first gig on the page. """
-        XPATH_FIRST_GIG = "//div[contains(@class, 'cl-results-page')]//ol/li[1]//a[1]"
         gig_element = WebDriverWait(self.driver, 15).until(
             EC.presence_of_element_located((By.XPATH, XPATH_FIRST_GIG))
         )
@@ -31,7 +32,6 @@ class NavigateSite:
         Returns:
             bool: True if it there is another gig to go to, otherwise False.
         """
-        XPATH_NEXT_PAGE_BTN =  "//a[contains(@class, 'next')]"
         next_page_btn = WebDriverWait(self.driver, 10).until(
             EC.presence_of_element_located((By.XPATH, XPATH_NEXT_PAGE_BTN))
         )
@@ -40,7 +40,6 @@ class NavigateSite:
     
     def navigate_to_next_gig(self) -> None:
         """ Get to the next gig via "clicking" on the "next" button. """
-        XPATH_NEXT_PAGE_BTN =  "//a[contains(@class, 'next')]"
         next_page_btn = WebDriverWait(self.driver, 10).until(
             EC.element_to_be_clickable((By.XPATH, XPATH_NEXT_PAGE_BTN))
         )
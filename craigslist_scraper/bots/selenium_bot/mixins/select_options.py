@@ -5,6 +5,7 @@ from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 
+from craigslist_scraper.bots.xpaths import XPATH_PAID_BUTTON, XPATH_APPLY_BUTTON
 from craigslist_scraper.bots.utils import human_sleep_seconds, gaussian_number_generator
 
 
@@ -17,9 +18,6 @@ class SelectOptions:
         Select the button on the left hand side of the screen to search for only
         paid options.
         """
-        XPATH_PAID_BUTTON = "//*[@name='is_paid']/following-sibling::*//button[text()='paid']"
-        XPATH_APPLY_BUTTON = "//button[contains(@class, 'cl-exec-search')]"
-
         paid_btn_element = WebDriverWait(self.driver, 10).until(
             EC.element_to_be_clickable((By.XPATH, XPATH_PAID_BUTTON))
         )
@@ -37,4 +35,4 @@ class SelectOptions:
             .perform()
 
         logger.info('Selected only paid gigs option')
-        human_sleep_seconds(1, 3)
\ No newline at end of file
+        human_sleep_seconds(1, 3, self.clock)
\ No newline at end of file
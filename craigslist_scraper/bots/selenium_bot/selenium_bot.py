@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+from urllib.parse import urlencode
 import random
 import logging
+import uuid
 
 import undetected_chromedriver as uc
+from selenium.common.exceptions import WebDriverException
 
 from .mixins.clicker import Clicker
 from .mixins.get_gig_data import GetGigData
@@ -12,6 +15,11 @@ from .mixins.load_page import LoadPage
 from .mixins.select_options import SelectOptions
 from craigslist_scraper.bots.abstract_bot_class import CraigslistBot
 from craigslist_scraper.bots.utils import estimate_compensation, human_sleep_seconds
+from craigslist_scraper.bots.bot_exceptions import UnableToGetToPageError
+from craigslist_scraper.metrics import JobMetrics
+from craigslist_scraper.proxy_pool import ProxyPool, Proxy
+from craigslist_scraper.clock import Clock, REAL_CLOCK
+from craigslist_scraper.search import Search
 
 from typing import TYPE_CHECKING
 
@@ -34,36 +42,106 @@ class SeleniumBot(
         Selenium-based Craigslist Boston Gigs scraper. Uses mixin classes to 
         keep the everything organized.
     """
-    def __init__(self):
+    def __init__(
+            self,
+            location: str = 'boston',
+            search_path: str = 'ggg',
+            filters: dict[str, str] = None,
+            metrics: JobMetrics = None,
+            proxy_pool: ProxyPool = None,
+            clock: Clock = None
+        ):
         """
+        Args:
+            location: The Craigslist subdomain to scrape.
+            search_path: The Craigslist category, e.g. 'ggg' for gigs.
+            filters: Query string parameters of the search page. Defaults to
+                the default filters of the category (see Search).
+            metrics: Where the phase and page load timings are recorded.
+            proxy_pool: If set, Chrome uses a proxy from this pool. Chrome's 
+                --proxy-server flag can't take credentials, so the proxies 
+                need to be authorized by IP.
+            clock: What the bot (and its mixins) sleep with. Defaults to the real clock.
+
         Attrs:
             driver: An instance of UndetectedChromeDriver, which is just
                 an instance of the Chrome WebDriver with a few patches to make
                 it more stealthy.
             base_url: The base Craigslist url.
+            filters: See Args.
+            metrics: See Args.
+            proxy_pool: See Args.
+            proxy_session_key: The key of the bot in the proxy pool. Chrome's 
+                cookies stay with the bot, so it sticks to one proxy like a session.
+            proxy: The proxy that Chrome uses, or None.
+            clock: See Args.
+        """
+        self.base_url: str = f'https://{location}.craigslist.org/search/{search_path}'
+        self.filters: dict[str, str] = Search(search_path, filters).filters
+        self.clock: Clock = clock or REAL_CLOCK
+        self.metrics: JobMetrics = metrics if metrics is not None else JobMetrics(self.clock)
+        self.proxy_pool: ProxyPool = proxy_pool
+        self.proxy_session_key: str = uuid.uuid4().hex
+        self.proxy: Proxy = None
+        self.driver: WebDriver = self.create_driver()
+
+    def create_driver(self) -> WebDriver:
+        """ 
+        Start a headless (undetected) Chrome, through the bot's proxy if there is 
+        a proxy pool. A restarted driver gets a new proxy if the old one was 
+        quarantined in the meantime.
         """
-        self.driver: WebDriver = uc.Chrome(headless=True)
-        self.base_url: int = 'https://boston.craigslist.org/search/ggg'
+        options = uc.ChromeOptions()
+        if self.proxy_pool is not None:
+            self.proxy = self.proxy_pool.acquire(self.proxy_session_key)
+            options.add_argument(f'--proxy-server={self.proxy.url}')
+
+        return uc.Chrome(headless=True, options=options)
+
+    def report_page(self, ok: bool, latency: float = None, blocked: bool = False) -> None:
+        """ Report a page to the proxy pool (see ProxyPool.report) if Chrome uses a proxy. """
+        if self.proxy is not None:
+            self.proxy_pool.report(self.proxy, ok=ok, latency=latency, blocked=blocked)
+
+    def release_proxy(self) -> None:
+        """ Let the proxy pool forget the bot, once its driver has quit. """
+        if self.proxy_pool is not None:
+            self.proxy_pool.release(self.proxy_session_key)
 
     def get_all_gigs(self) -> list[dict[str, str]]:
         """
         The client facing method to get all of the gigs and then shut down the driver.
+        The pages that load are reported to the proxy pool as they load (see 
+        load_page and get_to_page). The page that stops the run is reported here: 
+        as blocked if the bot couldn't get to it, as a failure if it timed out
+        or didn't load.
 
         Returns:
             More documentation about this in the abstract base class.
         """
         try:
             return self._get_all_gigs()
+
+        except UnableToGetToPageError:
+            self.report_page(ok=False, blocked=True)
+            raise
+
+        except WebDriverException:
+            self.report_page(ok=False)
+            raise
+
         finally:
             self.driver.quit()
+            self.release_proxy()
     
     def _get_all_gigs(self) -> list[dict[str, str]]:
         """ 
-        Gets data on all of the paid gigs in Boston.
+        Gets data on all of the gigs of the search in the location.
 
         Steps:
-            1. Load the Craigslist page
-            2. Select the button to search for only paid gigs
+            1. Load the Craigslist search page with the filters
+            2. If the search is for paid gigs, select the button to search for only 
+               paid gigs (the other categories don't have it)
             3. Go to the Gig on the top of the first page
             4. Get the data on the gig
             5. If it can click the "next" button on the gig page, click it
@@ -72,14 +150,20 @@ class SeleniumBot(
         Returns:
             More documentation about this in the abstract base class.
         """
-        self.load_page(self.base_url)
-        self.select_only_paid_gigs()
-        self.navigate_to_first_gig()
+        click_paid = self.filters.get('is_paid') == 'yes'
+        query = {name: value for name, value in self.filters.items() if not (click_paid and name == 'is_paid')}
+
+        with self.metrics.phase('search_page'):
+            self.load_page(f'{self.base_url}?{urlencode(query)}' if query else self.base_url)
+            if click_paid:
+                self.select_only_paid_gigs()
+            self.navigate_to_first_gig()
 
         data = []
         another_gig = self.next_page_available()
         while another_gig:
-            title, comp, gig_id = self.get_gig_data()
+            with self.metrics.phase('parse'):
+                title, comp, gig_id = self.get_gig_data()
             logger.info(f'Scraped gig: "{title}"')
             data.append({
                 'gig_id': gig_id,
@@ -88,11 +172,13 @@ class SeleniumBot(
                 'comp_estimate': estimate_compensation(comp) 
             })
 
-            human_sleep_seconds(3, 10)
-            if random.randint(1, 20) == 1: human_sleep_seconds(10, 50)
-            if random.randint(1, 200) == 1: human_sleep_seconds(50, 250)
+            human_sleep_seconds(3, 10, self.clock)
+            if random.randint(1, 20) == 1: human_sleep_seconds(10, 50, self.clock)
+            if random.randint(1, 200) == 1: human_sleep_seconds(50, 250, self.clock)
 
             another_gig = self.next_page_available()
-            if another_gig: self.navigate_to_next_gig()
+            if another_gig:
+                with self.metrics.phase('navigate'):
+                    self.navigate_to_next_gig()
                 
         return data
\ No newline at end of file
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import uuid
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from curl_cffi import requests
+    from craigslist_scraper.clock import Clock
+    from craigslist_scraper.metrics import JobMetrics
+    from craigslist_scraper.proxy_pool import ProxyPool
+
+
+BLOCKED_STATUS_CODES: tuple[int, ...] = (403, 429)
+
+
+def proxy_session_key(session: requests.Session) -> str:
+    """
+    Returns:
+        The key of a session in the proxy pool. It's stored on the session, so it
+        stays the same while the session is reused and is never shared with a
+        later session (unlike id(session)).
+    """
+    if getattr(session, 'proxy_session_key', None) is None:
+        session.proxy_session_key = uuid.uuid4().hex
+    return session.proxy_session_key
+
+
+class SessionRequests:
+    """
+    Mixin for the bots that use a curl_cffi session (APIBot and HTMLBot).
+
+    Expects the bot to have these attributes: bot_type, session, tls_fingerprint,
+    metrics, proxy_pool (which can be None) and clock.
+    """
+    bot_type: str
+    session: requests.Session
+    tls_fingerprint: str
+    metrics: JobMetrics
+    proxy_pool: ProxyPool | None
+    clock: Clock
+
+    def _get(self, name: str, url: str, metrics: JobMetrics = None, **kwargs) -> requests.Response:
+        """
+        Send a GET request with the session (through the session's proxy, if
+        there is a proxy pool) and record its latency, status code and size in
+        self.metrics and the proxy's health in the proxy pool. Only connection 
+        errors, blocks (403/429) and server errors count against the proxy; a 404
+        is the posting's fault, not the proxy's.
+
+        Args:
+            name: What the request is for, e.g. 'full' or 'posting'.
+            url: The url to request.
+            metrics: Where to record the request instead of self.metrics.
+            **kwargs: Passed on to session.get().
+
+        Returns:
+            The response.
+        """
+        proxy = None
+        if self.proxy_pool is not None:
+            proxy = self.proxy_pool.acquire(self.proxy_session_key)
+            kwargs['proxies'] = {'http': proxy.url, 'https': proxy.url}
+
+        start = self.clock.monotonic()
+        try:
+            resp = self.session.get(url, impersonate=self.tls_fingerprint, **kwargs)
+
+        except Exception:
+            if proxy is not None:
+                self.proxy_pool.report(proxy, ok=False)
+            raise
+
+        duration = self.clock.monotonic() - start
+        (metrics or self.metrics).record_request(
+            name, url, self.bot_type,
+            duration=duration,
+            status=resp.status_code,
+            size=len(resp.content)
+        )
+
+        if proxy is not None:
+            blocked = resp.status_code in BLOCKED_STATUS_CODES
+            self.proxy_pool.report(
+                proxy,
+                ok=not blocked and resp.status_code < 500,
+                latency=duration,
+                blocked=blocked
+            )
+
+        return resp
+
+    @property
+    def proxy_session_key(self) -> str:
+        """ Sessions stick to one proxy so that their cookies always come from the same IP. """
+        return proxy_session_key(self.session)
+
+    def release_proxy(self) -> None:
+        """ Let the proxy pool forget the session, once the session won't be used again. """
+        if self.proxy_pool is not None:
+            self.proxy_pool.release(self.proxy_session_key)
@@ -1,7 +1,7 @@
+import random
 import re
-import time
 
-import numpy as np
+from craigslist_scraper.clock import Clock, REAL_CLOCK
 
 
 def estimate_compensation(comp_msg: str) -> float:
@@ -48,15 +48,30 @@ def gaussian_number_generator(
     mean = (high + low) / 2
     std_dev = (high - low) / Kurtosis
     
-    while (number := np.random.normal(mean, std_dev)) < low:
+    while (number := random.gauss(mean, std_dev)) < low:
         pass
     
     return round(number, 3)
 
 
-def human_sleep_seconds(low: int | float, high: int | float) -> float:
-    return time.sleep(gaussian_number_generator(low, high))
+def human_sleep_seconds(low: int | float, high: int | float, clock: Clock = None) -> float:
+    """
+    Sleep for a random number of seconds between low and high (see 
+    gaussian_number_generator). 
+
+    Args:
+        clock: What sleeps. Defaults to the real clock.
+
+    Returns:
+        The seconds slept.
+    """
+    seconds = gaussian_number_generator(low, high)
+    (clock or REAL_CLOCK).sleep(seconds)
+    return seconds
 
 
-def human_sleep_milliseconds(low: int | float, high: int | float) -> float:
-    return time.sleep(gaussian_number_generator(low, high) / 1000)
\ No newline at end of file
+def human_sleep_milliseconds(low: int | float, high: int | float, clock: Clock = None) -> float:
+    """ Like human_sleep_seconds(), but low and high are in milliseconds. Returns seconds. """
+    seconds = gaussian_number_generator(low, high) / 1000
+    (clock or REAL_CLOCK).sleep(seconds)
+    return seconds
\ No newline at end of file
@@ -0,0 +1,24 @@
+"""
+XPath expressions for Craigslist's server-rendered pages.
+
+These are shared by the Selenium mixins and the HTML bot so that a change to
+Craigslist's markup only has to be fixed in one place.
+"""
+
+# Search results page
+XPATH_FIRST_GIG = "//div[contains(@class, 'cl-results-page')]//ol/li[1]//a[1]"
+XPATH_STATIC_RESULTS = "//ol[contains(@class, 'cl-static-search-results')]"
+XPATH_STATIC_GIG_LINKS = "//li[contains(@class, 'cl-static-search-result')]/a/@href"
+XPATH_STATIC_NEXT_PAGE = "//a[@rel='next' or contains(@class, 'cl-next-page')]/@href"
+XPATH_PAID_BUTTON = "//*[@name='is_paid']/following-sibling::*//button[text()='paid']"
+XPATH_APPLY_BUTTON = "//button[contains(@class, 'cl-exec-search')]"
+
+# Posting (gig) page
+XPATH_COMP = "(//p|//span)[contains(text(), 'compensation')]/b"
+XPATH_TITLE = "//*[@id='titletextonly']"
+XPATH_NEXT_PAGE_BTN = "//a[contains(@class, 'next')]"
+
+# Posting details (see DetailFetcher)
+XPATH_POSTING_BODY = "//section[@id='postingbody']"
+XPATH_NEIGHBORHOOD = "//span[contains(@class, 'postingtitletext')]/span[not(@id) and not(@class)]"
+XPATH_POSTED_DATE = "(//*[contains(@class, 'postinginfo')]//time/@datetime)[1]"
@@ -0,0 +1,63 @@
+import hashlib
+
+
+NEW: str = 'new'
+REMOVED: str = 'removed'
+CHANGED: str = 'changed'
+
+
+def content_hash(title: str | None, comp_message: str | None) -> int:
+    """
+    A 64 bit hash of the text of a gig, stored in gig_data.content_hash so that
+    comparing two jobs doesn't have to compare the text itself.
+
+    Returns:
+        A signed 64 bit integer (the range of a SQLite integer).
+    """
+    text = f'{title or ""}\0{comp_message or ""}'.encode()
+    return int.from_bytes(hashlib.blake2b(text, digest_size=8).digest(), 'big', signed=True)
+
+
+def diff_gigs(
+        previous: list[tuple[int, int, float]],
+        current: list[tuple[int, int, float]]
+    ) -> list[dict[str, int | float | str]]:
+    """
+    Compare the gigs of two jobs in one pass over both lists.
+
+    Args:
+        previous: (gig_id, content_hash, comp_estimate) of the older job, sorted by gig_id.
+        current: The same for the newer job, sorted by gig_id.
+
+    Returns:
+        One dict per difference: {gig_id, change, old_comp_estimate, new_comp_estimate},
+        where change is NEW, REMOVED or CHANGED (the title or compensation text changed).
+    """
+    changes = []
+    i = j = 0
+
+    while i < len(previous) or j < len(current):
+        if j == len(current) or (i < len(previous) and previous[i][0] < current[j][0]):
+            gig_id, _, old_estimate = previous[i]
+            changes.append({'gig_id': gig_id, 'change': REMOVED, 'old_comp_estimate': old_estimate, 'new_comp_estimate': None})
+            i += 1
+
+        elif i == len(previous) or current[j][0] < previous[i][0]:
+            gig_id, _, new_estimate = current[j]
+            changes.append({'gig_id': gig_id, 'change': NEW, 'old_comp_estimate': None, 'new_comp_estimate': new_estimate})
+            j += 1
+
+        else:
+            gig_id, old_hash, old_estimate = previous[i]
+            _, new_hash, new_estimate = current[j]
+            if old_hash != new_hash:
+                changes.append({
+                    'gig_id': gig_id,
+                    'change': CHANGED,
+                    'old_comp_estimate': old_estimate,
+                    'new_comp_estimate': new_estimate
+                })
+            i += 1
+            j += 1
+
+    return changes
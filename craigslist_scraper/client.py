@@ -1,15 +1,25 @@
-import time
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import contextlib
+import sqlite3
+import importlib
 import logging
 
 from .bots.abstract_bot_class import CraigslistBot
-from .logger import configure_logger
-from .bots import APIBot, SeleniumBot
+from .logger import configure_logger, get_log_file
 from .bots.utils import human_sleep_seconds
 from .bots.bot_exceptions import BadRequestError
+from .bots.session_requests import proxy_session_key
 from .db_manager import DBHandler
+from .strategy import StrategySelector
+from .metrics import JobMetrics, PrometheusExporter
+from .proxy_pool import ProxyPool
+from .archive import ResponseArchive, JobArchive
+from .search import Search
+from .profiling import Profiler
+from .clock import Clock, REAL_CLOCK
 
 
-configure_logger()
 logger = logging.getLogger(__name__)
 
 
@@ -18,82 +28,727 @@ class Client:
     The main client that lets you interface with the actual bots.
 
     The main method here is "run". This will attempt to scrape the data from 
-    Craigslist. There are two bots that the method has to work with. It first 
-    tries to use the API, but if that doesn't work, it will switch to using the
-    slower, Selenium scraper.
+    Craigslist. There are three bots that the method has to work with. It first 
+    tries to use the API, but if that doesn't work, it will switch to scraping the
+    HTML pages without a browser, and only then to the slowest, Selenium scraper.
+    Bots that have been failing are skipped until their circuit breaker closes.
     """
-    def __init__(self, db_file: str = 'database.db'):
+    def __init__(
+            self,
+            db_file: str = 'database.db',
+            reuse_sessions: bool = False,
+            hedge_after: float = None,
+            prometheus_file: str = None,
+            proxy_pool: ProxyPool = None,
+            archive_dir: str = None,
+            profile: str = None,
+            clock: Clock = None,
+            enrich_details: bool = False,
+            detail_workers: int = 4,
+            detail_url: str = None
+        ):
         """
         Create the SQLite database if it does not exist and sets self.bots to
-        a list of available bots.
+        a list of available bots. Sets up the default logger unless 
+        configure_logger() has already been called.
 
         Args:
             db_file: This is where the database will be stored. The db is created
                 automatically on first run!
+            reuse_sessions: Keep the HTTP sessions and the database connection
+                open between runs. This is what the daemon mode uses, so that
+                every run doesn't have to redo the TLS handshakes.
+            hedge_after: If set, the number of seconds after which the next bot 
+                is started in parallel with a bot that hasn't finished yet.
+            prometheus_file: If set, the metrics of every job are also written to
+                this file for the Prometheus node_exporter textfile collector.
+            proxy_pool: If set, the bots send their requests through proxies
+                from this pool.
+            archive_dir: If set, the raw API responses are archived in this 
+                directory, so that they can be parsed again later.
+            profile: If set, every run is profiled ('cprofile' or 'sampling', see
+                Profiler) and the profile is written next to the log file.
+            clock: What the Client, the strategy selector and the bots sleep with
+                and get the time from. Pass a VirtualClock to run without the 
+                human-like pauses (e.g. in tests and benchmarks).
+            enrich_details: After every job, fetch the posting pages of the gigs
+                that are new or changed to store their body, neighborhood and 
+                posted date (see DetailFetcher).
+            detail_workers: How many posting pages are fetched at the same time.
+            detail_url: The url template of a posting page, see DetailFetcher.
         
         Attrs:
             db: An instance of the database handler.
             bot_in_use: I continence var to signify which bot type (selenium or api)
                 is currently being used.
-            bots: A dictionary of all of the available bots.
+            bots: A dictionary of all of the available bots. The values are the
+                import paths of the bot classes, which are only imported when the
+                bot is first used (so an API-only run never imports Selenium).
+            reuse_sessions: See Args.
+            sessions: The warm HTTP sessions, keyed by (bot type, location, searches).
+            selector: Picks the bots to use based on their circuit breakers.
+            hedge_after: See Args.
+            prometheus: The PrometheusExporter, if prometheus_file is set.
+            proxy_pool: See Args.
+            archive: The ResponseArchive, if archive_dir is set.
+            profiler: The Profiler, if profile is set.
+            clock: See Args.
+            detail_fetcher: The import path of the DetailFetcher, only imported
+                if enrich_details is on.
+            enrich_details, detail_workers, detail_url: See Args.
         """
-        self.db: DBHandler = DBHandler(db_file)
+        if get_log_file() is None:
+            configure_logger()
+
+        self.db: DBHandler = DBHandler(db_file, keep_open=reuse_sessions)
+        self.clock: Clock = clock or REAL_CLOCK
 
         self.bot_in_use: str = None
         self.bots: dict[str, str] = {
-            'api': APIBot,
-            'selenium': SeleniumBot
+            'api': 'craigslist_scraper.bots.api_bot.APIBot',
+            'html': 'craigslist_scraper.bots.html_bot.HTMLBot',
+            'selenium': 'craigslist_scraper.bots.selenium_bot.SeleniumBot'
         }
+
+        self.reuse_sessions: bool = reuse_sessions
+        self.sessions: dict[tuple[str, str, str], object] = {}
+
+        self.selector: StrategySelector = StrategySelector(self.db, order=tuple(self.bots), clock=self.clock)
+        self.hedge_after: float = hedge_after
+        self.prometheus: PrometheusExporter = PrometheusExporter(prometheus_file, self.clock) if prometheus_file else None
+        self.proxy_pool: ProxyPool = proxy_pool
+        self.archive: ResponseArchive = ResponseArchive(archive_dir) if archive_dir else None
+        self.profiler: Profiler = Profiler(profile) if profile else None
+
+        self.detail_fetcher: str = 'craigslist_scraper.bots.detail_fetcher.DetailFetcher'
+        self.enrich_details: bool = enrich_details
+        self.detail_workers: int = detail_workers
+        self.detail_url: str = detail_url
     
-    def run(self) -> None:
+    def run(
+            self,
+            location: str = 'boston',
+            category: str = 'ggg',
+            bot_type: str = None,
+            before_commit: Callable[[], None] = None,
+            filters: dict[str, str] = None
+        ) -> int:
         """
-        Run the scraper. This method attempts to scrape all of the paid gigs from 
-        the Boston Gigs page of Craigslist and then stores the data into the 
-        SQLite database.
+        Run the scraper. This method attempts to scrape all of the gigs of a 
+        Craigslist search (the paid gigs of Boston Gigs by default) and then stores
+        the data into the SQLite database.
+
+        The bots are tried in the order given by the strategy selector, which 
+        skips the bots whose circuit breaker is open. If hedge_after is set, the
+        next (cheaper than Selenium) bot is started in parallel once the first
+        one has been running for that many seconds.
+
+        The time spent in each phase and on each request is stored in the 
+        job_metrics table alongside the job. If every bot fails, the run is stored
+        in failed_runs with its metrics instead.
+
+        Args:
+            location: The Craigslist subdomain to scrape.
+            category: The Craigslist search path to scrape.
+            bot_type: Only use this bot (one of the keys of self.bots) instead
+                of letting the strategy selector decide.
+            before_commit: Called right before the job is committed; if it raises,
+                the job isn't stored (see DBHandler.add_gig_scraping_job).
+            filters: The query string filters of the search (see Search). Defaults
+                to the default filters of the category. Every bot gets them, and 
+                the job is stored with them.
+
+        Returns:
+            The id of the job in the database.
 
         Raises:
-            This will try to catch the first big bot error and then switch to another
-            scraping method. However, if the second attempt to scrape the data
-            raises an error, this method won't catch it.
+            This will try to catch the bot errors and then switch to another
+            scraping method. However, if the last scraping method raises an 
+            error, this method won't catch it.
+        """
+        return self._run_search(location, Search(category, filters), bot_type, before_commit)
+
+    def _run_search(
+            self,
+            location: str,
+            search: Search,
+            bot_type: str = None,
+            before_commit: Callable[[], None] = None,
+            tried: list[str] = (),
+            earlier_metrics: list[JobMetrics] = ()
+        ) -> int:
+        """
+        See run().
+
+        Args:
+            tried: The bots that already failed on this search (the API bot of 
+                run_searches()). Only stored if this run fails too.
+            earlier_metrics: The metrics of those attempts, stored with the job,
+                or with the failed run if this run fails too.
+        """
+        category = search.search_path
+        label = category if search.filter_string is None else str(search)
+
+        with self._profile(f'{location}_{label}'):
+            start_time = self.clock.time()
+            metrics = JobMetrics(self.clock)
+            job_archive = self.archive.for_job(self.clock) if self.archive is not None else None
+            plan = [bot_type] if bot_type else self._plan(location)
+
+            try:
+                with metrics.phase('scrape'), self._track('scrape'):
+                    bot_type, data = self._scrape(plan, location, search, metrics, job_archive)
+
+            except Exception as e:
+                self._store_failure(location, search, label, [*tried, *plan], e, [*earlier_metrics, metrics], start_time)
+                raise
+
+            logger.info(f'Scraped all gigs! Number: {len(data)}')
+            with metrics.phase('db_insert'), self._track('db_insert'):
+                job_id = self.db.add_gig_scraping_job(
+                    bot_used=bot_type,
+                    duration=str(self.clock.time() - start_time),
+                    gigs=data,
+                    location=location,
+                    category=category,
+                    filters=search.filter_string,
+                    before_commit=before_commit,
+                    store_with_job=self._store_with_job(
+                        [*earlier_metrics, metrics],
+                        job_archive if bot_type == 'api' else None
+                    )
+                )
+
+            if self.enrich_details:
+                with metrics.phase('enrich'), self._track('enrich'):
+                    self._enrich(job_id, location, category, metrics, data)
+
+            self._finish_job(job_id, location, label, metrics, gig_count=len(data))
+            return job_id
+
+    def run_searches(self, location: str = 'boston', searches: list[Search] = None) -> list[int]:
+        """
+        Scrape several searches (categories and filters) of a location with one 
+        API bot session, so the cookie is only fetched once and the /full requests
+        run in parallel. Every search is stored as its own job, tagged with its
+        category and filters, with the metrics of its own requests. The metrics of
+        what the searches share (the cookie and the total time) are stored with 
+        the first job.
+
+        If the API bot's circuit breaker is open or the API bot fails, the searches
+        are scraped one by one with run(), which falls back to the other bots. The
+        metrics of a failed API attempt are stored with those jobs, and it only
+        counts as a failed run if the other bots fail as well.
+
+        Args:
+            location: The Craigslist subdomain to scrape.
+            searches: The searches. Defaults to paid gigs.
+
+        Returns:
+            The ids of the jobs, in the order of the searches.
+        """
+        searches = searches or [Search()]
+
+        with self._profile(f'{location}_searches'):
+            return self._run_searches(location, searches)
+
+    def _run_searches(self, location: str, searches: list[Search]) -> list[int]:
+        """ See run_searches(). """
+        earlier = {}
+        if not self._supports('api', location):
+            logger.warning(f'The api bot can\'t scrape {location}. Scraping the searches one by one')
+
+        elif self.selector.allows('api'):
+            start_time = self.clock.time()
+            metrics = JobMetrics(self.clock)
+            search_metrics = {search: JobMetrics(self.clock) for search in searches}
+            archives = {search: self.archive.for_job(self.clock) for search in searches} if self.archive is not None else None
+            bot = None
+
+            try:
+                with metrics.phase('scrape'), self._track('scrape'):
+                    bot = self._get_bot(
+                        'api',
+                        location=location,
+                        searches=searches,
+                        metrics=metrics,
+                        proxy_pool=self.proxy_pool,
+                        archives=archives,
+                        search_metrics=search_metrics,
+                        clock=self.clock
+                    )
+                    logger.info(f'Using api to scrape {location}: {", ".join(map(str, searches))}')
+                    with metrics.phase('bot', detail='api'):
+                        results = bot.get_all_searches()
+
+            except Exception as e:
+                self.selector.record_failure('api')
+                logger.exception(e)
+                logger.warning('Switching to scraping the searches one by one')
+
+                # The failed API attempt is stored with the jobs of the fallback (or
+                # their failed runs), so it only counts as a failure if they fail too
+                earlier = {
+                    search: {'tried': ['api'], 'earlier_metrics': ([metrics] if i == 0 else []) + [search_metrics[search]]}
+                    for i, search in enumerate(searches)
+                }
+
+            else:
+                self.selector.record_success('api')
+                return self._store_searches(location, results, metrics, search_metrics, archives, start_time)
+
+            finally:
+                self._release_proxy(bot)
+
+        return [self._run_search(location, search, **earlier.get(search, {})) for search in searches]
+
+    def _store_searches(
+            self,
+            location: str,
+            results: dict[Search, list[dict[str, str]]],
+            metrics: JobMetrics,
+            search_metrics: dict[Search, JobMetrics],
+            archives: dict[Search, JobArchive],
+            start_time: float
+        ) -> list[int]:
+        """ Store the gigs and metrics of each search of run_searches() as a job. """
+        job_ids = []
+
+        for search, data in results.items():
+            logger.info(f'Scraped all gigs of {search}! Number: {len(data)}')
+            own_metrics = search_metrics[search]
+            with own_metrics.phase('db_insert', detail=str(search)), self._track(f'db_insert {search}'):
+                job_id = self.db.add_gig_scraping_job(
+                    bot_used='api',
+                    duration=str(self.clock.time() - start_time),
+                    gigs=data,
+                    location=location,
+                    category=search.search_path,
+                    filters=search.filter_string,
+                    store_with_job=self._store_with_job(
+                        # The shared metrics go with the first job
+                        ([] if job_ids else [metrics]) + [own_metrics],
+                        archives[search] if archives is not None else None
+                    )
+                )
+            job_ids.append(job_id)
+
+            if self.enrich_details:
+                with own_metrics.phase('enrich', detail=str(search)), self._track(f'enrich {search}'):
+                    self._enrich(job_id, location, search.search_path, own_metrics)
+
+            self._finish_job(job_id, location, str(search), own_metrics, gig_count=len(data))
+
+        return job_ids
+
+    def _store_with_job(
+            self,
+            metrics: list[JobMetrics],
+            job_archive: JobArchive = None
+        ) -> Callable[[sqlite3.Cursor, int], None]:
         """
-        start_time = time.time()
-        bot = self._get_bot('api')
+        Returns:
+            A store_with_job callback for DBHandler.add_gig_scraping_job() that stores 
+            the metrics recorded so far and the archived responses in the job's
+            transaction, so the job is never stored without them.
+        """
+        def store(cur: sqlite3.Cursor, job_id: int) -> None:
+            for part in metrics:
+                phases, requests = part.take_unstored()
+                self.db.insert_job_metrics(cur, job_id, phases, requests)
+            if job_archive is not None:
+                self.db.insert_raw_responses(cur, job_id, job_archive.entries)
+
+        return store
 
+    def _finish_job(self, job_id: int, location: str, label: str, metrics: JobMetrics, gig_count: int) -> None:
+        """
+        Store the metrics recorded after the job was committed (the insert itself
+        and the enrichment) and export the job to Prometheus. The job is already 
+        stored, so errors are only logged: raising would make a caller like the 
+        work queue scrape and store the same job again.
+
+        Args:
+            label: The category label in Prometheus.
+        """
         try:
-            logger.info(f'Using {self.bot_in_use} to scrape data')
-            data = bot.get_all_gigs()
+            phases, requests = metrics.take_unstored()
+            self.db.add_job_metrics(job_id, phases=phases, requests=requests)
+        except Exception as e:
+            logger.error(f'Could not store the last metrics of job {job_id}', exc_info=e)
 
-        except BadRequestError as e:
+        if self.prometheus is not None:
+            try:
+                self.prometheus.export(location, label, metrics, gig_count=gig_count)
+            except Exception as e:
+                logger.error(f'Could not export the metrics of job {job_id} to Prometheus', exc_info=e)
+
+    def _store_failure(
+            self,
+            location: str,
+            search: Search,
+            label: str,
+            bots_tried: list[str],
+            error: Exception,
+            metrics: list[JobMetrics],
+            start_time: float
+        ) -> None:
+        """
+        Store a run where every bot failed in failed_runs, with its metrics, and
+        count it in Prometheus. Errors here are only logged, so that they don't 
+        hide the error of the run.
+
+        Args:
+            location: The Craigslist subdomain of the run.
+            search: The category and filters of the run.
+            label: The category label in Prometheus (the same as export() got).
+            bots_tried: The bot types that were tried.
+            error: The error of the last bot.
+            metrics: The metrics of the run (several if a part of them is shared).
+            start_time: When the run started (clock time).
+        """
+        try:
+            failed_run_id = self.db.add_failed_run(
+                bots_tried=', '.join(bots_tried),
+                duration=self.clock.time() - start_time,
+                error=f'{type(error).__name__}: {error}'[:500],
+                location=location,
+                category=search.search_path,
+                filters=search.filter_string
+            )
+            for part in metrics:
+                self.db.add_job_metrics(None, phases=part.phases, requests=part.requests, failed_run_id=failed_run_id)
+
+            if self.prometheus is not None:
+                self.prometheus.export_failure(location, label)
+
+        except Exception as e:
+            logger.error(f'Could not store the failed run of {location}/{search}', exc_info=e)
+
+    def _enrich(
+            self,
+            job_id: int,
+            location: str,
+            category: str,
+            metrics: JobMetrics,
+            scraped: list[dict[str, str]] = None
+        ) -> None:
+        """
+        Fetch and store the details of the gigs of a job that are new or have
+        changed since their details were fetched. The job is already stored, so
+        a failure here is logged instead of failing the run; the gigs that were
+        missed are picked up by the next job.
+
+        Args:
+            job_id: The job that was just stored.
+            location: The Craigslist subdomain of the job.
+            category: The Craigslist search path of the job.
+            metrics: Where the request timings are recorded.
+            scraped: The gigs the bot returned. The details that the HTML bot
+                already parsed from the posting pages are used instead of 
+                fetching the pages again.
+        """
+        try:
+            gigs = self.db.get_gigs_to_enrich(job_id)
+            if not gigs:
+                logger.info(f'All gigs of job {job_id} already have their details')
+                return
+
+            known = {gig['gig_id']: gig['details'] for gig in scraped or [] if gig.get('details')}
+            details = [{**known[gig['gig_id']], **gig} for gig in gigs if gig['gig_id'] in known]
+            gigs = [gig for gig in gigs if gig['gig_id'] not in known]
+            if details:
+                logger.info(f'Using the details of {len(details)} gigs from the scraped posting pages')
+
+            if gigs:
+                details += self._fetch_details(job_id, gigs, location, category, metrics)
+
+            self.db.add_gig_details(details)
+
+        except Exception as e:
+            logger.exception(e)
+            logger.warning(f'Could not store the details of the gigs of job {job_id}')
+            return
+
+        logger.info(f'Stored the details of {len(details)} gigs of job {job_id}')
+
+    def _fetch_details(
+            self,
+            job_id: int,
+            gigs: list[dict[str, int]],
+            location: str,
+            category: str,
+            metrics: JobMetrics
+        ) -> list[dict[str, str | int | float]]:
+        """
+        Fetch the posting pages of gigs with the DetailFetcher (see _enrich()).
+
+        Returns:
+            The details (and tombstones) that were fetched; none if the fetcher failed.
+        """
+        key = ('details', location, category)
+        fetcher = None
+        try:
+            fetcher = self._load_bot_class(self.detail_fetcher)(
+                location=location,
+                search_path=category,
+                session=self.sessions.get(key),
+                max_workers=self.detail_workers,
+                url_template=self.detail_url,
+                metrics=metrics,
+                proxy_pool=self.proxy_pool,
+                clock=self.clock
+            )
+            if self.reuse_sessions:
+                self.sessions[key] = fetcher.session
+
+            return fetcher.fetch_all(gigs)
+
+        except Exception as e:
             logger.exception(e)
-            human_sleep_seconds(100, 300) 
+            logger.warning(f'Could not get the details of the gigs of job {job_id}')
+            return []
+
+        finally:
+            self._release_proxy(fetcher)
+
+    def _profile(self, label: str) -> contextlib.AbstractContextManager:
+        """ Profile a run if profiling is on. """
+        return self.profiler.profile(label) if self.profiler is not None else contextlib.nullcontext()
+
+    def _track(self, phase: str) -> contextlib.AbstractContextManager:
+        """ Report the allocations of a phase if profiling is on. """
+        return self.profiler.track(phase) if self.profiler is not None else contextlib.nullcontext()
 
+    def _release_proxy(self, bot: object) -> None:
+        """ 
+        Let the proxy pool forget a bot's session once the bot is done with it. 
+        Warm sessions keep their proxy until close().
+        """
+        if bot is not None and not self.reuse_sessions and hasattr(bot, 'release_proxy'):
+            bot.release_proxy()
+
+    def close(self) -> None:
+        """ Close the warm sessions and the database connection. """
+        for session in self.sessions.values():
+            if self.proxy_pool is not None:
+                self.proxy_pool.release(proxy_session_key(session))
+            session.close()
+        self.sessions.clear()
+        self.db.close()
+    
+    def _scrape(
+            self,
+            plan: list[str],
+            location: str,
+            search: Search,
+            metrics: JobMetrics,
+            job_archive: JobArchive = None
+        ) -> tuple[str, list[dict[str, str]]]:
+        """
+        Try the bots in the plan until one of them works.
+
+        Args:
+            plan: The bot types to try, in order.
+            location: The Craigslist subdomain to scrape.
+            search: The category and filters to scrape.
+            metrics: Passed on to the bots.
+            job_archive: Passed on to the API bot.
+
+        Returns:
+            A tuple of the bot type that worked and the gigs (more documentation 
+            about this in the abstract base class).
+        """
+        if self.hedge_after is not None and len(plan) > 1 and plan[1] != 'selenium':
             try:
-                logger.info(f'Attempting to use {self.bot_in_use} to get data again')
-                data = bot.get_all_gigs()
+                return self._run_hedged(plan[0], plan[1], location, search, metrics, job_archive)
 
             except Exception as e:
+                if len(plan) == 2:
+                    raise
+
                 logger.exception(e)
-                logger.warning('Switching to Selenium bot')
-                bot = self._get_bot('selenium')
+                logger.warning(f'Switching to {plan[2]} bot')
+                plan = plan[2:]
+
+        for i, bot_type in enumerate(plan):
+            try:
+                return bot_type, self._run_strategy(bot_type, location, search, metrics, job_archive)
+
+            except Exception as e:
+                if i == len(plan) - 1:
+                    raise
+
+                logger.exception(e)
+                logger.warning(f'Switching to {plan[i + 1]} bot')
+
+    def _run_strategy(
+            self,
+            bot_type: str,
+            location: str,
+            search: Search,
+            metrics: JobMetrics,
+            job_archive: JobArchive = None
+        ) -> list[dict[str, str]]:
+        """
+        Scrape with one bot and update its circuit breaker. If the API responds
+        with a bad request, it is tried one more time after a long sleep, unless
+        that failure opened its circuit breaker.
+
+        Args:
+            bot_type: One of the keys from self.bots.
+            location: The Craigslist subdomain to scrape.
+            search: The category and filters to scrape.
+            metrics: Passed on to the bot.
+            job_archive: Passed on to the bot if it is the API bot (the only bot
+                whose responses can be parsed again).
+
+        Returns:
+            More documentation about this in the abstract base class.
+        """
+        archive_kwargs = {'archive': job_archive} if bot_type == 'api' and job_archive is not None else {}
+        bot = self._get_bot(
+            bot_type,
+            location=location,
+            search_path=search.search_path,
+            filters=search.filters,
+            metrics=metrics,
+            proxy_pool=self.proxy_pool,
+            clock=self.clock,
+            **archive_kwargs
+        )
+        logger.info(f'Using {bot_type} to scrape {location}/{search}')
+
+        try:
+            with metrics.phase('bot', detail=bot_type):
                 data = bot.get_all_gigs()
 
-        except Exception as e:
+        except BadRequestError as e:
+            self.selector.record_failure(bot_type)
+            if bot_type != 'api' or not self.selector.allows(bot_type):
+                raise
+
             logger.exception(e)
-            logger.warning('Switching to Selenium bot')
-            bot = self._get_bot('selenium')
-            data = bot.get_all_gigs()
-
-        logger.info(f'Scraped all gigs! Number: {len(data)}')
-        self.db.add_gig_scraping_job(
-            bot_used=self.bot_in_use,
-            duration=str(time.time() - start_time),
-            gigs=data
-        )
-    
+            with metrics.phase('retry_sleep', detail=bot_type):
+                human_sleep_seconds(100, 300, self.clock)
+
+            if job_archive is not None:
+                job_archive.clear()
+
+            logger.info(f'Attempting to use {bot_type} to get data again')
+            try:
+                with metrics.phase('bot', detail=bot_type):
+                    data = bot.get_all_gigs()
+            except Exception:
+                self.selector.record_failure(bot_type)
+                raise
+
+        except Exception:
+            self.selector.record_failure(bot_type)
+            raise
+
+        finally:
+            self._release_proxy(bot)
+
+        self.selector.record_success(bot_type)
+        return data
+
+    def _run_hedged(
+            self,
+            primary: str,
+            hedge: str,
+            location: str,
+            search: Search,
+            metrics: JobMetrics,
+            job_archive: JobArchive = None
+        ) -> tuple[str, list[dict[str, str]]]:
+        """
+        Start the primary bot, and if it fails or hasn't finished after 
+        self.hedge_after seconds, start the hedge bot as well. The first one to
+        succeed wins. A losing bot can't be interrupted, so it finishes in the 
+        background and its data is thrown away.
+
+        Args:
+            primary: The bot type to start with.
+            hedge: The bot type to start once the primary is too slow.
+            location: The Craigslist subdomain to scrape.
+            search: The category and filters to scrape.
+            metrics: Shared by both bots.
+            job_archive: Passed on to the bots.
+
+        Returns:
+            A tuple of the bot type that worked and its gigs.
+
+        Raises:
+            The error of the last bot to fail if both of them fail.
+        """
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='hedge')
+        primary_future = executor.submit(self._run_strategy, primary, location, search, metrics, job_archive)
+
+        try:
+            done, _ = wait([primary_future], timeout=self.hedge_after)
+            if done and primary_future.exception() is None:
+                return primary, primary_future.result()
+
+            if not done:
+                logger.warning(f'{primary} bot is over its {self.hedge_after} second budget. Starting {hedge} bot')
+            
+            futures = {
+                primary_future: primary,
+                executor.submit(self._run_strategy, hedge, location, search, metrics, job_archive): hedge
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return futures[future], future.result()
+
+                    error = future.exception()
+                    logger.error(error, exc_info=error)
+                    if pending:
+                        logger.warning(f'{futures[future]} bot failed. Waiting for the other bot')
+
+            raise error
+
+        finally:
+            executor.shutdown(wait=False)
+
+    def _plan(self, location: str) -> list[str]:
+        """
+        Returns:
+            The plan of the strategy selector without the bots that can't scrape
+            the location. Those aren't tried at all, so they don't count as 
+            failures for their circuit breaker.
+        """
+        plan = self.selector.plan()
+        supported = [bot_type for bot_type in plan if self._supports(bot_type, location)]
+
+        if len(supported) < len(plan):
+            logger.warning(f'Skipping bots that can\'t scrape {location}: {sorted(set(plan) - set(supported))}')
+
+        return supported or [bot_type for bot_type in self.bots if self._supports(bot_type, location)][-1:]
+
+    def _supports(self, bot_type: str, location: str) -> bool:
+        """ 
+        Returns: 
+            False if the bot can't scrape the location. Only the API bot is limited
+            to some locations (it needs their area id); the class is only imported
+            to check when it's the API bot.
+        """
+        if bot_type != 'api':
+            return True
+
+        supports = getattr(self._load_bot_class(self.bots[bot_type]), 'supports', None)
+        return supports is None or supports(location)
+
     def _get_bot(self, bot_type: str, *args, **kwargs) -> CraigslistBot:
         """
         A convince method used to get and initialize a bot instance and then set
-        the instance variable "bot_in_use".
+        the instance variable "bot_in_use". If reuse_sessions is on, the bot is
+        given the warm session from the last run for the same location and 
+        search (runs of other searches can happen at the same time, so they
+        don't share a session and its cookies).
 
         Args:
             bot_type: One of the keys from self.bots (the dict that 
@@ -105,4 +760,31 @@ class Client:
             A CraigslistBot child class instance.
         """
         self.bot_in_use = bot_type
-        return self.bots[bot_type](*args, **kwargs)
\ No newline at end of file
+        bot_class = self._load_bot_class(self.bots[bot_type])
+
+        if not self.reuse_sessions or bot_type == 'selenium':
+            return bot_class(*args, **kwargs)
+
+        searches = kwargs.get('searches') or [Search(kwargs.get('search_path', 'ggg'), kwargs.get('filters'))]
+        key = (bot_type, kwargs.get('location'), ','.join(map(str, searches)))
+        bot = bot_class(*args, session=self.sessions.get(key), **kwargs)
+        self.sessions[key] = bot.session
+        return bot
+
+    @staticmethod
+    def _load_bot_class(path: str | type[CraigslistBot]) -> type[CraigslistBot]:
+        """
+        Import a bot class from its import path. Classes are passed through so
+        that self.bots can also be given the classes directly.
+
+        Args:
+            path: Something like 'craigslist_scraper.bots.api_bot.APIBot'.
+
+        Returns:
+            The CraigslistBot child class.
+        """
+        if isinstance(path, type):
+            return path
+
+        module_name, class_name = path.rsplit('.', 1)
+        return getattr(importlib.import_module(module_name), class_name)
@@ -0,0 +1,78 @@
+import threading
+import time
+
+
+class Clock:
+    """
+    The time source and sleeper of the Client, the bots and the scheduler. This
+    one is the real clock; pass a VirtualClock instead to skip the sleeps.
+
+    Class Attrs:
+        virtual: True if the time only moves when something sleeps.
+    """
+    virtual: bool = False
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        """
+        Wait until the event is set or the timeout has passed.
+
+        Returns:
+            True if the event is set.
+        """
+        return event.wait(timeout)
+
+
+class VirtualClock(Clock):
+    """
+    A clock whose sleeps return straight away. The time still moves forward by
+    the amount that was slept, on top of the real time, so durations, circuit
+    breaker cooldowns and schedules behave as if the sleeps had happened, and
+    every sleep is recorded so the pacing can be checked afterwards.
+
+    Sleeps from parallel threads all move the same clock forward, so with several
+    threads the virtual time overestimates the real wall time.
+    """
+    virtual: bool = True
+
+    def __init__(self):
+        """
+        Attrs:
+            offset: The total seconds slept so far.
+            sleeps: One (thread name, virtual monotonic time, seconds) tuple per sleep.
+            lock: Sleeps can come from several threads.
+        """
+        self.offset: float = 0.0
+        self.sleeps: list[tuple[str, float, float]] = []
+        self.lock = threading.Lock()
+
+    def time(self) -> float:
+        return time.time() + self.offset
+
+    def monotonic(self) -> float:
+        return time.monotonic() + self.offset
+
+    def sleep(self, seconds: float) -> None:
+        with self.lock:
+            self.sleeps.append((threading.current_thread().name, self.monotonic(), seconds))
+            self.offset += seconds
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        if not event.is_set():
+            self.sleep(timeout)
+        return event.is_set()
+
+    @property
+    def total_slept(self) -> float:
+        return self.offset
+
+
+REAL_CLOCK: Clock = Clock()
@@ -1,28 +1,82 @@
+from typing import Iterator, Callable
+from operator import itemgetter
+from array import array
+import threading
+import heapq
 import sqlite3
 import contextlib
 from pathlib import Path
 import logging
 
+from .changes import content_hash, diff_gigs
+from .geo import bounding_box, distance_miles
+from . import dedupe
+
 
 logger = logging.getLogger(__name__)
 
 
 class DBHandler:
-    def __init__(self, path: str = 'database.db'):
+    def __init__(self, path: str = 'database.db', keep_open: bool = False, timeout: float = 60):
         """
         An object to handle the database requests
 
         Args:
             Path: The file path of the SQLite database.
+            keep_open: Keep one connection open for the lifetime of the handler
+                instead of opening a new one per request. Used by the daemon mode.
+            timeout: How many seconds to wait for another process's write lock
+                (e.g. the other workers of a work queue) before "database is locked".
         
         Attrs:
             db: This is the path to the SQLite database file.
+            timeout: See Args.
+            conn: The shared connection if keep_open is True, otherwise None.
+            lock: Serializes the use of the shared connection between threads.
         """
         self.db: str = path
+        self.timeout: float = timeout
+        self.conn: sqlite3.Connection = None
+        self.lock = threading.Lock()
+
         if not Path(path).exists():
             self.create_db()
+        else:
+            self.update_schema()
+
+        if keep_open:
+            self.conn = sqlite3.connect(self.db, timeout=self.timeout, check_same_thread=False)
+
+    @contextlib.contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Yields the shared connection (while holding the lock) if there is one,
+        otherwise a new connection that is closed afterwards.
+        """
+        if self.conn is None:
+            with contextlib.closing(sqlite3.connect(self.db, timeout=self.timeout)) as conn:
+                yield conn
+        else:
+            with self.lock:
+                yield self.conn
+
+    def close(self) -> None:
+        """ Close the shared connection (if there is one). """
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
     
-    def add_gig_scraping_job(self, bot_used: str, duration: int, gigs: list[dict[str, str]]) -> None:
+    def add_gig_scraping_job(
+            self,
+            bot_used: str,
+            duration: int,
+            gigs: list[dict[str, str]],
+            location: str = 'boston',
+            category: str = 'ggg',
+            filters: str = None,
+            before_commit: Callable[[], None] = None,
+            store_with_job: Callable[[sqlite3.Cursor, int], None] = None
+        ) -> int:
         """ 
         Adds a scraping job to the database.
 
@@ -30,28 +84,46 @@ class DBHandler:
             gigs: This is a list of dictionaries which contain one gig each.
             bot_used: The bot used to scrape the data.
             duration: The time to complete the scraping job (in seconds).
+            location: The Craigslist location that was scraped.
+            category: The Craigslist category (search path) that was scraped.
+            filters: The search filters as a query string (see Search.filter_string),
+                None for the default filters of the category.
+            before_commit: Called right before the transaction is committed. If it
+                raises, nothing is stored (e.g. when a work queue worker lost its lease).
+            store_with_job: Called with the cursor and the id of the new job inside 
+                the transaction, to store what belongs to the job (its metrics and 
+                raw responses) together with it.
+
+        Returns:
+            The id of the new job.
         """
         job_query = '''
             insert into jobs
-            (duration, bot_used)
+            (duration, bot_used, location, category, filters)
             values
-            (:duration, :bot_used);
+            (:duration, :bot_used, :location, :category, :filters);
         '''
-        gig_query = '''
-            insert into gig_data
-            (job_id, gig_id, title, comp_message, comp_estimate)
-            values
-            (:job_id, :gig_id, :title, :comp_message, :comp_estimate);
-        ''' 
-
-        with contextlib.closing(sqlite3.connect(self.db)) as conn:
+        with self.connect() as conn:
             try:
                 cur = conn.cursor()
                 cur.execute('begin')
 
-                cur.execute(job_query, {'duration': duration, 'bot_used': bot_used})
-                self.update_gigs_with_job_id(gigs, job_id=cur.lastrowid)
-                cur.executemany(gig_query, gigs)
+                cur.execute(job_query, {
+                    'duration': duration,
+                    'bot_used': bot_used,
+                    'location': location,
+                    'category': category,
+                    'filters': filters
+                })
+                job_id = cur.lastrowid
+                self.insert_gigs(cur, gigs, job_id=job_id)
+                self.record_changes(cur, job_id)
+                self.cluster_gigs(cur, gigs)
+
+                if store_with_job is not None:
+                    store_with_job(cur, job_id)
+                if before_commit is not None:
+                    before_commit()
 
             except Exception as e:
                 conn.rollback()
@@ -64,6 +136,733 @@ class DBHandler:
             finally:
                 cur.close()
 
+        return job_id
+
+    def add_failed_run(
+            self,
+            bots_tried: str,
+            duration: float,
+            error: str,
+            location: str = 'boston',
+            category: str = 'ggg',
+            filters: str = None
+        ) -> int:
+        """
+        Record a run that didn't store a job because every bot failed. Its metrics
+        are stored with add_job_metrics(failed_run_id=...).
+
+        Args:
+            bots_tried: The bots that were tried, e.g. 'api, html'.
+            duration: How long the run took before it failed (in seconds).
+            error: The error of the last bot.
+            location, category, filters: See add_gig_scraping_job().
+
+        Returns:
+            The id of the failed run.
+        """
+        query = '''
+            insert into failed_runs
+            (bots_tried, duration, error, location, category, filters)
+            values
+            (:bots_tried, :duration, :error, :location, :category, :filters);
+        '''
+
+        with self.connect() as conn:
+            with conn:
+                return conn.execute(query, {
+                    'bots_tried': bots_tried,
+                    'duration': duration,
+                    'error': error,
+                    'location': location,
+                    'category': category,
+                    'filters': filters
+                }).lastrowid
+
+    def add_job_metrics(
+            self,
+            job_id: int | None,
+            phases: list[dict[str, str | float]],
+            requests: list[dict[str, str | float | int]],
+            failed_run_id: int = None
+        ) -> None:
+        """
+        Store the timings of a job (see metrics.JobMetrics).
+
+        Args:
+            job_id: The job the metrics belong to, None for a failed run.
+            phases: The timed phases of the job.
+            requests: The requests sent during the job.
+            failed_run_id: The failed run the metrics belong to (see add_failed_run()).
+        """
+        with self.connect() as conn:
+            with conn:
+                self.insert_job_metrics(conn.cursor(), job_id, phases, requests, failed_run_id)
+
+    def insert_job_metrics(
+            self,
+            cur: sqlite3.Cursor,
+            job_id: int | None,
+            phases: list[dict[str, str | float]],
+            requests: list[dict[str, str | float | int]],
+            failed_run_id: int = None
+        ) -> None:
+        """ See add_job_metrics(). Inserts inside the caller's transaction. """
+        query = '''
+            insert into job_metrics
+            (job_id, failed_run_id, kind, name, detail, bot_used, started_at, duration, status, bytes, error)
+            values
+            (:job_id, :failed_run_id, :kind, :name, :detail, :bot_used, :started_at, :duration, :status, :bytes, :error);
+        '''
+        ids = {'job_id': job_id, 'failed_run_id': failed_run_id}
+        rows = [
+            {'bot_used': None, 'status': None, 'bytes': None, 'error': None, **phase, **ids, 'kind': 'phase'}
+            for phase in phases
+        ] + [
+            {'error': None, **request, **ids, 'kind': 'request'}
+            for request in requests
+        ]
+
+        cur.executemany(query, rows)
+
+    def add_raw_responses(self, job_id: int, entries: list[dict[str, str | int | float]]) -> None:
+        """
+        Link archived raw responses to their job (see archive.JobArchive).
+
+        Args:
+            job_id: The job the responses belong to.
+            entries: The archive entries of the job.
+        """
+        with self.connect() as conn:
+            with conn:
+                self.insert_raw_responses(conn.cursor(), job_id, entries)
+
+    def insert_raw_responses(self, cur: sqlite3.Cursor, job_id: int, entries: list[dict[str, str | int | float]]) -> None:
+        """ See add_raw_responses(). Inserts inside the caller's transaction. """
+        query = '''
+            insert into raw_responses
+            (job_id, seq, endpoint, params, sha256, size, compressed_size, fetched_at)
+            values
+            (:job_id, :seq, :endpoint, :params, :sha256, :size, :compressed_size, :fetched_at);
+        '''
+
+        cur.executemany(query, [{**entry, 'job_id': job_id} for entry in entries])
+
+    def get_raw_responses(self, endpoint: str, job_ids: list[int] = None) -> dict[int, list[str]]:
+        """
+        Args:
+            endpoint: 'full' or 'batch'.
+            job_ids: Only return the responses of these jobs. Defaults to all jobs.
+
+        Returns:
+            The sha256s of the archived responses of every job, in the order 
+            they were received: {job_id: [sha256, ...], ...}
+        """
+        query = '''
+            select job_id, sha256
+            from raw_responses
+            where endpoint = ?
+            order by job_id, seq;
+        '''
+
+        with self.connect() as conn:
+            rows = conn.execute(query, (endpoint,)).fetchall()
+
+        responses = {}
+        for job_id, sha256 in rows:
+            if job_ids is None or job_id in job_ids:
+                responses.setdefault(job_id, []).append(sha256)
+
+        return responses
+
+    def replace_job_gigs(self, job_id: int, gigs: list[dict[str, str]]) -> None:
+        """
+        Replace the gigs of an existing job, e.g. after parsing its archived
+        responses again. The changes of this job and of the job after it are 
+        computed again too.
+
+        Args:
+            job_id: The job to rebuild.
+            gigs: The new gigs of the job.
+        """
+        with self.connect() as conn:
+            with conn:
+                cur = conn.cursor()
+                cur.execute('delete from gig_data where job_id = ?', (job_id,))
+                self.insert_gigs(cur, gigs, job_id=job_id)
+                self.record_changes(cur, job_id)
+                self.cluster_gigs(cur, gigs)
+
+                # The next job might have had no changes, so it's looked up in jobs
+                next_job_id = cur.execute('''
+                    select min(next.id)
+                    from jobs
+                    inner join jobs as next
+                        on next.location = jobs.location
+                        and next.category = jobs.category
+                        and next.filters is jobs.filters
+                        and next.id > jobs.id
+                    where jobs.id = :job_id;
+                ''', {'job_id': job_id}).fetchone()[0]
+                if next_job_id is not None:
+                    self.record_changes(cur, next_job_id)
+
+    def insert_gigs(self, cur: sqlite3.Cursor, gigs: list[dict[str, str]], *, job_id: int) -> None:
+        """
+        Insert the gigs of a job (inside the caller's transaction).
+
+        Args:
+            cur: A cursor of the connection that holds the transaction.
+            gigs: A list of gigs.
+            job_id: The job the gigs belong to.
+        """
+        gig_query = '''
+            insert into gig_data
+            (job_id, gig_id, title, comp_message, comp_estimate, content_hash, latitude, longitude)
+            values
+            (:job_id, :gig_id, :title, :comp_message, :comp_estimate, :content_hash, :latitude, :longitude);
+        '''
+
+        self.update_gigs_with_job_id(gigs, job_id=job_id)
+        for gig in gigs:
+            gig['content_hash'] = content_hash(gig['title'], gig['comp_message'])
+            # Only the API bot knows where a gig is
+            gig.setdefault('latitude', None)
+            gig.setdefault('longitude', None)
+
+        cur.executemany(gig_query, gigs)
+
+    def record_changes(self, cur: sqlite3.Cursor, job_id: int) -> None:
+        """
+        Compare a job with the previous job of the same location, category and
+        filters and store the new, removed and changed gigs in gig_changes. Both sides
+        are read in gig_id order (the primary key), so this is a single merge 
+        pass over the two jobs.
+
+        Args:
+            cur: A cursor of the connection that holds the transaction.
+            job_id: The (newer) job.
+        """
+        previous_job_query = '''
+            select max(previous.id)
+            from jobs
+            inner join jobs as previous
+                on previous.location = jobs.location
+                and previous.category = jobs.category
+                and previous.filters is jobs.filters
+                and previous.id < jobs.id
+            where jobs.id = :job_id;
+        '''
+        gigs_query = '''
+            select gig_id, content_hash, title, comp_message, comp_estimate
+            from gig_data
+            where job_id = :job_id
+            order by gig_id;
+        '''
+        change_query = '''
+            insert into gig_changes
+            (job_id, previous_job_id, gig_id, change, old_comp_estimate, new_comp_estimate)
+            values
+            (:job_id, :previous_job_id, :gig_id, :change, :old_comp_estimate, :new_comp_estimate);
+        '''
+
+        cur.execute('delete from gig_changes where job_id = :job_id', {'job_id': job_id})
+
+        previous_job_id = cur.execute(previous_job_query, {'job_id': job_id}).fetchone()[0]
+        if previous_job_id is None:
+            return
+
+        def load(job_id: int) -> list[tuple[int, int, float]]:
+            # Rows scraped before content_hash existed get their hash here.
+            return [
+                (gig_id, hash if hash is not None else content_hash(title, comp_message), estimate)
+                for gig_id, hash, title, comp_message, estimate
+                in cur.execute(gigs_query, {'job_id': job_id}).fetchall()
+            ]
+
+        changes = diff_gigs(load(previous_job_id), load(job_id))
+        cur.executemany(change_query, [
+            {**change, 'job_id': job_id, 'previous_job_id': previous_job_id}
+            for change in changes
+        ])
+        logger.info(f'Job {job_id} has {len(changes)} changes since job {previous_job_id}')
+
+    def cluster_gigs(self, cur: sqlite3.Cursor, gigs: list[dict[str, str]]) -> None:
+        """
+        Put every gig that hasn't been seen before in a cluster of near-duplicate 
+        gigs (reposts with a new gig id and a slightly edited title). Only gigs that
+        share an LSH bucket with the new gig are compared, and a gig that matches 
+        more than one cluster merges them.
+
+        Args:
+            cur: A cursor of the connection that holds the transaction.
+            gigs: A list of gigs.
+        """
+        candidates_query = f'''
+            select distinct gig_signatures.gig_id, gig_signatures.signature, gig_clusters.cluster_id
+            from gig_lsh_buckets
+            inner join gig_signatures on gig_signatures.gig_id = gig_lsh_buckets.gig_id
+            inner join gig_clusters on gig_clusters.gig_id = gig_lsh_buckets.gig_id
+            where gig_lsh_buckets.bucket in ({', '.join('?' * dedupe.BANDS)});
+        '''
+        new_clusters = 0
+
+        for gig in gigs:
+            if cur.execute('select 1 from gig_signatures where gig_id = ?', (gig['gig_id'],)).fetchone():
+                continue
+
+            signature = dedupe.minhash(gig['title'])
+            buckets = dedupe.lsh_buckets(signature)
+
+            # One similar member is enough to join a cluster, so skip the rest of its members
+            matched = set()
+            for _, other, cluster_id in cur.execute(candidates_query, buckets).fetchall():
+                if cluster_id not in matched and dedupe.similarity(signature, array('I', other)) >= dedupe.SIMILARITY_THRESHOLD:
+                    matched.add(cluster_id)
+            clusters = sorted(matched)
+
+            if clusters:
+                cluster_id = clusters[0]
+                if len(clusters) > 1:
+                    cur.execute(
+                        f'update gig_clusters set cluster_id = ? where cluster_id in ({", ".join("?" * (len(clusters) - 1))})',
+                        clusters
+                    )
+            else:
+                cluster_id = gig['gig_id']
+                new_clusters += 1
+
+            cur.execute('insert into gig_signatures (gig_id, signature) values (?, ?)', (gig['gig_id'], signature.tobytes()))
+            cur.execute('insert into gig_clusters (gig_id, cluster_id) values (?, ?)', (gig['gig_id'], cluster_id))
+            cur.executemany(
+                'insert or ignore into gig_lsh_buckets (bucket, gig_id) values (?, ?)',
+                [(bucket, gig['gig_id']) for bucket in buckets]
+            )
+
+        logger.info(f'Clustered the new gigs, {new_clusters} new clusters')
+
+    def rebuild_clusters(self) -> None:
+        """ Cluster every gig in the database again, e.g. after changing the dedupe settings. """
+        # The bare title column comes from the row with max(job_id), so the latest title is used
+        query = '''
+            select gig_id, title, max(job_id)
+            from gig_data
+            group by gig_id
+            order by gig_id;
+        '''
+
+        with self.connect() as conn:
+            with conn:
+                cur = conn.cursor()
+                for table in ('gig_signatures', 'gig_lsh_buckets', 'gig_clusters'):
+                    cur.execute(f'delete from {table}')
+
+                gigs = [{'gig_id': gig_id, 'title': title} for gig_id, title, _ in cur.execute(query).fetchall()]
+                self.cluster_gigs(cur, gigs)
+
+        logger.info(f'Rebuilt the clusters of {len(gigs)} gigs')
+
+    def count_unique_gigs(self, job_id: int) -> tuple[int, int]:
+        """
+        Args:
+            job_id: The job.
+
+        Returns:
+            The number of gigs of the job and the number of unique gigs (clusters). 
+            Gigs that were never clustered count as their own cluster.
+        """
+        query = '''
+            select count(*), count(distinct coalesce(gig_clusters.cluster_id, gig_data.gig_id))
+            from gig_data
+            left join gig_clusters on gig_clusters.gig_id = gig_data.gig_id
+            where gig_data.job_id = :job_id;
+        '''
+
+        with self.connect() as conn:
+            return conn.execute(query, {'job_id': job_id}).fetchone()
+
+    def estimate_total_comp(self, job_id: int, unique: bool = False) -> tuple[float | None, int | None]:
+        """
+        Estimates are classified as yearly (> 1000), daily (> 200) or hourly pay. 
+        Estimates above 20000 are ignored.
+
+        Args:
+            job_id: The job.
+            unique: Count reposts of the same gig once, with their highest estimate.
+
+        Returns:
+            The summed hourly pay and the summed hours of the gigs of the job.
+        """
+        if unique:
+            gigs = '''
+                select max(gig_data.comp_estimate) as comp_estimate
+                from gig_data
+                left join gig_clusters on gig_clusters.gig_id = gig_data.gig_id
+                where gig_data.job_id = :job_id
+                group by coalesce(gig_clusters.cluster_id, gig_data.gig_id)
+            '''
+        else:
+            gigs = 'select comp_estimate from gig_data where job_id = :job_id'
+
+        query = f'''
+            select sum(
+                    case
+                        when comp_estimate > 20000 then 0
+                        when comp_estimate > 1000 then comp_estimate / 40
+                        when comp_estimate > 200 then comp_estimate / 8
+                        else comp_estimate
+                    end
+                ) as total_estimate_per_hour,
+                sum(
+                    case
+                        when comp_estimate > 20000 then 0
+                        when comp_estimate > 1000 then 40
+                        when comp_estimate > 200 then 8
+                        else 1
+                    end
+                ) as total_hours
+            from ({gigs});
+        '''
+
+        with self.connect() as conn:
+            return conn.execute(query, {'job_id': job_id}).fetchone()
+
+    def get_changes(self, job_id: int) -> list[dict[str, str | int | float]]:
+        """
+        Args:
+            job_id: The job to get the changes of.
+
+        Returns:
+            The gigs that are new, removed or changed since the previous job of the
+            same location and category: [{gig_id, change, previous_job_id, title,
+            comp_message, old_comp_estimate, new_comp_estimate}, ...]. For removed 
+            gigs the title and comp_message are the last ones seen.
+        """
+        query = '''
+            select gig_changes.gig_id, gig_changes.change, gig_changes.previous_job_id,
+                gig_data.title, gig_data.comp_message,
+                gig_changes.old_comp_estimate, gig_changes.new_comp_estimate
+            from gig_changes
+            inner join gig_data
+                on gig_data.gig_id = gig_changes.gig_id
+                and gig_data.job_id = case 
+                    when gig_changes.change = 'removed' then gig_changes.previous_job_id
+                    else gig_changes.job_id
+                end
+            where gig_changes.job_id = :job_id
+            order by gig_changes.change, gig_changes.gig_id;
+        '''
+        columns = [
+            'gig_id', 'change', 'previous_job_id', 'title', 'comp_message',
+            'old_comp_estimate', 'new_comp_estimate'
+        ]
+
+        with self.connect() as conn:
+            rows = conn.execute(query, {'job_id': job_id}).fetchall()
+
+        return [dict(zip(columns, row)) for row in rows]
+
+    def get_latest_job_id(self, location: str = 'boston', category: str = 'ggg', filters: str = None) -> int | None:
+        """ 
+        Args:
+            filters: See add_gig_scraping_job(). None for the default filters of the category.
+
+        Returns: The id of the latest job of a location, category and filters. 
+        """
+        query = '''
+            select max(id)
+            from jobs
+            where location = :location and category = :category and filters is :filters;
+        '''
+
+        with self.connect() as conn:
+            params = {'location': location, 'category': category, 'filters': filters}
+            return conn.execute(query, params).fetchone()[0]
+
+    def search_gigs(
+            self,
+            query: str,
+            *,
+            min_job_id: int = None,
+            max_job_id: int = None,
+            min_comp: float = None,
+            max_comp: float = None,
+            raw: bool = False,
+            limit: int = 50
+        ) -> list[dict[str, str | int | float]]:
+        """
+        Full-text search over the title and compensation text of the gigs, best
+        matches first (bm25, a match in the title counts double).
+
+        Args:
+            query: The words to look for. By default they're searched for as a phrase,
+                so "focus group" and "$50" just work.
+            min_job_id: Only gigs of this job or later.
+            max_job_id: Only gigs of this job or earlier.
+            min_comp: Only gigs with a comp_estimate of at least this.
+            max_comp: Only gigs with a comp_estimate of at most this.
+            raw: Pass the query to FTS5 as is, e.g. 'title:moving OR "heavy lifting"'.
+            limit: The max number of results.
+
+        Returns:
+            [{job_id, gig_id, title, comp_message, comp_estimate, rank}, ...]
+        """
+        filters = {
+            'gig_data.job_id >= :min_job_id': min_job_id,
+            'gig_data.job_id <= :max_job_id': max_job_id,
+            'gig_data.comp_estimate >= :min_comp': min_comp,
+            'gig_data.comp_estimate <= :max_comp': max_comp,
+        }
+        where = ''.join(f' and {condition}' for condition, value in filters.items() if value is not None)
+
+        search_query = f'''
+            select gig_data.job_id, gig_data.gig_id, gig_data.title, gig_data.comp_message,
+                gig_data.comp_estimate, bm25(gig_search, 2.0, 1.0) as rank
+            from gig_search
+            inner join gig_data on gig_data.rowid = gig_search.rowid
+            where gig_search match :query{where}
+            order by rank
+            limit :limit;
+        '''
+        columns = ['job_id', 'gig_id', 'title', 'comp_message', 'comp_estimate', 'rank']
+
+        if not raw:
+            query = '"' + query.replace('"', '""') + '"'
+
+        with self.connect() as conn:
+            rows = conn.execute(search_query, {
+                'query': query,
+                'min_job_id': min_job_id,
+                'max_job_id': max_job_id,
+                'min_comp': min_comp,
+                'max_comp': max_comp,
+                'limit': limit
+            }).fetchall()
+
+        return [dict(zip(columns, row)) for row in rows]
+
+    def rebuild_search_index(self) -> None:
+        """ Build the gig search index again from gig_data and merge its segments. """
+        with self.connect() as conn:
+            with conn:
+                conn.execute("insert into gig_search (gig_search) values ('rebuild')")
+                conn.execute("insert into gig_search (gig_search) values ('optimize')")
+
+        logger.info('Rebuilt the gig search index')
+
+    def find_gigs_near(
+            self,
+            latitude: float,
+            longitude: float,
+            miles: float,
+            *,
+            min_job_id: int = None,
+            max_job_id: int = None,
+            min_comp: float = None,
+            max_comp: float = None,
+            limit: int = 50
+        ) -> list[dict[str, str | int | float]]:
+        """
+        Find the gigs within a radius of a point, closest first. The R*Tree index
+        narrows the gigs down to the bounding box of the circle, and only those
+        are checked against the exact distance.
+
+        Args:
+            latitude, longitude: The center.
+            miles: The radius.
+            min_job_id, max_job_id, min_comp, max_comp: See find_gigs_in_box().
+            limit: The max number of results.
+
+        Returns:
+            [{job_id, gig_id, title, comp_message, comp_estimate, latitude, longitude, miles}, ...]
+        """
+        gigs = self.find_gigs_in_box(
+            *bounding_box(latitude, longitude, miles),
+            min_job_id=min_job_id,
+            max_job_id=max_job_id,
+            min_comp=min_comp,
+            max_comp=max_comp,
+            limit=None
+        )
+
+        for gig in gigs:
+            gig['miles'] = distance_miles(latitude, longitude, gig['latitude'], gig['longitude'])
+
+        return heapq.nsmallest(limit, (gig for gig in gigs if gig['miles'] <= miles), key=itemgetter('miles'))
+
+    def find_gigs_in_box(
+            self,
+            min_latitude: float,
+            max_latitude: float,
+            min_longitude: float,
+            max_longitude: float,
+            *,
+            min_job_id: int = None,
+            max_job_id: int = None,
+            min_comp: float = None,
+            max_comp: float = None,
+            limit: int | None = 50
+        ) -> list[dict[str, str | int | float]]:
+        """
+        Find the gigs inside a bounding box with the R*Tree index. Only gigs 
+        scraped by the API bot have coordinates.
+
+        Args:
+            min_latitude, max_latitude, min_longitude, max_longitude: The box.
+            min_job_id: Only gigs of this job or later.
+            max_job_id: Only gigs of this job or earlier.
+            min_comp: Only gigs with a comp_estimate of at least this.
+            max_comp: Only gigs with a comp_estimate of at most this.
+            limit: The max number of results, None for all of them.
+
+        Returns:
+            [{job_id, gig_id, title, comp_message, comp_estimate, latitude, longitude}, ...]
+        """
+        filters = {
+            'gig_data.job_id >= :min_job_id': min_job_id,
+            'gig_data.job_id <= :max_job_id': max_job_id,
+            'gig_data.comp_estimate >= :min_comp': min_comp,
+            'gig_data.comp_estimate <= :max_comp': max_comp,
+        }
+        where = ''.join(f' and {condition}' for condition, value in filters.items() if value is not None)
+
+        # The R*Tree stores 32 bit floats rounded outwards, so the exact coordinates 
+        # in gig_data are checked as well. The cross join keeps the R*Tree as the 
+        # outer loop; otherwise a job id range makes SQLite scan gig_data through
+        # its (job_id, gig_id) index and search the R*Tree once per gig.
+        box_query = f'''
+            select gig_data.job_id, gig_data.gig_id, gig_data.title, gig_data.comp_message,
+                gig_data.comp_estimate, gig_data.latitude, gig_data.longitude
+            from gig_locations
+            cross join gig_data on gig_data.rowid = gig_locations.id
+            where gig_locations.max_latitude >= :min_latitude
+                and gig_locations.min_latitude <= :max_latitude
+                and gig_locations.max_longitude >= :min_longitude
+                and gig_locations.min_longitude <= :max_longitude
+                and gig_data.latitude between :min_latitude and :max_latitude
+                and gig_data.longitude between :min_longitude and :max_longitude{where}
+            limit :limit;
+        '''
+        columns = ['job_id', 'gig_id', 'title', 'comp_message', 'comp_estimate', 'latitude', 'longitude']
+
+        with self.connect() as conn:
+            rows = conn.execute(box_query, {
+                'min_latitude': min_latitude,
+                'max_latitude': max_latitude,
+                'min_longitude': min_longitude,
+                'max_longitude': max_longitude,
+                'min_job_id': min_job_id,
+                'max_job_id': max_job_id,
+                'min_comp': min_comp,
+                'max_comp': max_comp,
+                'limit': -1 if limit is None else limit
+            }).fetchall()
+
+        return [dict(zip(columns, row)) for row in rows]
+
+    def get_gigs_to_enrich(self, job_id: int) -> list[dict[str, int]]:
+        """
+        Args:
+            job_id: The job whose gigs might need their details.
+
+        Returns:
+            The gigs of the job whose details were never fetched, or were fetched
+            before the title or compensation changed: [{gig_id, content_hash}, ...]
+            A posting that was gone keeps its tombstone (see add_gig_details), so it
+            is skipped until the gig changes.
+        """
+        query = '''
+            select gig_data.gig_id, gig_data.content_hash
+            from gig_data
+            left join gig_details on gig_details.gig_id = gig_data.gig_id
+            where gig_data.job_id = :job_id
+                and (gig_details.gig_id is null or gig_details.content_hash is not gig_data.content_hash);
+        '''
+
+        with self.connect() as conn:
+            rows = conn.execute(query, {'job_id': job_id}).fetchall()
+
+        return [{'gig_id': gig_id, 'content_hash': content_hash} for gig_id, content_hash in rows]
+
+    def add_gig_details(self, details: list[dict[str, str | int | float]]) -> None:
+        """
+        Insert or replace the details of gigs.
+
+        Args:
+            details: [{gig_id, content_hash, body, neighborhood, posted_at, fetched_at, gone_at}, ...]
+                gone_at is set (and the rest is None) for a tombstone: the posting 
+                was deleted, so there is nothing to fetch. It can be left out otherwise.
+        """
+        query = '''
+            insert or replace into gig_details
+            (gig_id, content_hash, body, neighborhood, posted_at, fetched_at, gone_at)
+            values
+            (:gig_id, :content_hash, :body, :neighborhood, :posted_at, :fetched_at, :gone_at);
+        '''
+
+        with self.connect() as conn:
+            with conn:
+                conn.executemany(query, ({'gone_at': None, **detail} for detail in details))
+
+    def get_gig_details(self, gig_id: int) -> dict[str, str | int | float] | None:
+        """ Returns: The stored details (or tombstone) of a gig, or None if they were never fetched. """
+        query = '''
+            select gig_id, content_hash, body, neighborhood, posted_at, fetched_at, gone_at
+            from gig_details
+            where gig_id = :gig_id;
+        '''
+        columns = ['gig_id', 'content_hash', 'body', 'neighborhood', 'posted_at', 'fetched_at', 'gone_at']
+
+        with self.connect() as conn:
+            row = conn.execute(query, {'gig_id': gig_id}).fetchone()
+
+        return dict(zip(columns, row)) if row is not None else None
+
+    def get_circuit_breaker(self, bot_type: str) -> dict[str, str | int | float] | None:
+        """
+        Args:
+            bot_type: One of the keys of Client.bots.
+
+        Returns:
+            The stored state, failures and opened_at of the bot type's circuit 
+            breaker, or None if it has never been saved.
+        """
+        query = '''
+            select state, failures, opened_at
+            from circuit_breakers
+            where bot_type = :bot_type;
+        '''
+
+        with self.connect() as conn:
+            row = conn.execute(query, {'bot_type': bot_type}).fetchone()
+
+        if row is None:
+            return None
+
+        return {'state': row[0], 'failures': row[1], 'opened_at': row[2]}
+
+    def save_circuit_breaker(self, bot_type: str, state: str, failures: int, opened_at: float | None) -> None:
+        """ Insert or update the circuit breaker of a bot type. """
+        query = '''
+            insert into circuit_breakers
+            (bot_type, state, failures, opened_at)
+            values
+            (:bot_type, :state, :failures, :opened_at)
+            on conflict (bot_type) do update set
+                state = excluded.state,
+                failures = excluded.failures,
+                opened_at = excluded.opened_at,
+                updated_at = current_timestamp;
+        '''
+
+        with self.connect() as conn:
+            with conn:
+                conn.execute(query, {
+                    'bot_type': bot_type,
+                    'state': state,
+                    'failures': failures,
+                    'opened_at': opened_at
+                })
+
     @staticmethod
     def update_gigs_with_job_id(gigs: list[dict[str, str]], *, job_id: int) -> None:
         """
@@ -89,7 +888,7 @@ class DBHandler:
     def create_connection(self) -> None:
         """ Create a database connection to a SQLite database """
         try:
-            conn = sqlite3.connect(self.db)
+            conn = sqlite3.connect(self.db, timeout=self.timeout)
         finally:
             conn.close()
 
@@ -101,7 +900,10 @@ class DBHandler:
                 id integer primary key autoincrement, 
                 duration text,
                 bot_used text,
-                date_scraped text default current_timestamp
+                date_scraped text default current_timestamp,
+                location text default 'boston',
+                category text default 'ggg',
+                filters text
             );
             ''',
             '''
@@ -111,13 +913,215 @@ class DBHandler:
                 title text,
                 comp_message text,
                 comp_estimate integer,
+                content_hash integer,
+                latitude real,
+                longitude real,
                 foreign key (job_id) references jobs(job_id),
                 primary key (job_id, gig_id)
             );
+            ''',
+            '''
+            create virtual table if not exists gig_search using fts5 (
+                title,
+                comp_message,
+                content = 'gig_data',
+                tokenize = "unicode61 tokenchars '$'"
+            );
+            ''',
+            '''
+            create trigger if not exists gig_search_insert after insert on gig_data begin
+                insert into gig_search (rowid, title, comp_message)
+                values (new.rowid, new.title, new.comp_message);
+            end;
+            ''',
+            '''
+            create trigger if not exists gig_search_delete after delete on gig_data begin
+                insert into gig_search (gig_search, rowid, title, comp_message)
+                values ('delete', old.rowid, old.title, old.comp_message);
+            end;
+            ''',
+            '''
+            create trigger if not exists gig_search_update after update on gig_data begin
+                insert into gig_search (gig_search, rowid, title, comp_message)
+                values ('delete', old.rowid, old.title, old.comp_message);
+                insert into gig_search (rowid, title, comp_message)
+                values (new.rowid, new.title, new.comp_message);
+            end;
+            ''',
+            '''
+            create virtual table if not exists gig_locations using rtree (
+                id,
+                min_latitude, max_latitude,
+                min_longitude, max_longitude
+            );
+            ''',
+            '''
+            create trigger if not exists gig_locations_insert after insert on gig_data
+            when new.latitude is not null and new.longitude is not null begin
+                insert into gig_locations (id, min_latitude, max_latitude, min_longitude, max_longitude)
+                values (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude);
+            end;
+            ''',
+            '''
+            create trigger if not exists gig_locations_delete after delete on gig_data begin
+                delete from gig_locations where id = old.rowid;
+            end;
+            ''',
+            '''
+            create trigger if not exists gig_locations_update after update of latitude, longitude on gig_data begin
+                delete from gig_locations where id = old.rowid;
+                insert into gig_locations (id, min_latitude, max_latitude, min_longitude, max_longitude)
+                select new.rowid, new.latitude, new.latitude, new.longitude, new.longitude
+                where new.latitude is not null and new.longitude is not null;
+            end;
+            ''',
+            '''
+            create table if not exists gig_signatures (
+                gig_id integer primary key,
+                signature blob
+            );
+            ''',
+            '''
+            create table if not exists gig_lsh_buckets (
+                bucket integer,
+                gig_id integer,
+                primary key (bucket, gig_id)
+            ) without rowid;
+            ''',
+            '''
+            create table if not exists gig_clusters (
+                gig_id integer primary key,
+                cluster_id integer
+            );
+            ''',
+            '''
+            create index if not exists gig_clusters_cluster_id on gig_clusters (cluster_id);
+            ''',
+            '''
+            create table if not exists gig_details (
+                gig_id integer primary key,
+                content_hash integer,
+                body text,
+                neighborhood text,
+                posted_at text,
+                fetched_at real,
+                gone_at real
+            );
+            ''',
+            '''
+            create table if not exists gig_changes (
+                job_id integer,
+                previous_job_id integer,
+                gig_id integer,
+                change text,
+                old_comp_estimate integer,
+                new_comp_estimate integer,
+                foreign key (job_id) references jobs(id),
+                primary key (job_id, gig_id)
+            );
+            ''',
+            '''
+            create index if not exists gig_changes_previous_job_id on gig_changes (previous_job_id);
+            ''',
+            '''
+            create table if not exists job_metrics (
+                job_id integer,
+                kind text,
+                name text,
+                detail text,
+                bot_used text,
+                started_at real,
+                duration real,
+                status integer,
+                bytes integer,
+                failed_run_id integer,
+                error text,
+                foreign key (job_id) references jobs(id)
+            );
+            ''',
+            '''
+            create table if not exists failed_runs (
+                id integer primary key autoincrement,
+                bots_tried text,
+                duration real,
+                error text,
+                date_failed text default current_timestamp,
+                location text,
+                category text,
+                filters text
+            );
+            ''',
+            '''
+            create index if not exists job_metrics_job_id on job_metrics (job_id);
+            ''',
+            '''
+            create table if not exists raw_responses (
+                job_id integer,
+                seq integer,
+                endpoint text,
+                params text,
+                sha256 text,
+                size integer,
+                compressed_size integer,
+                fetched_at real,
+                foreign key (job_id) references jobs(id),
+                primary key (job_id, seq)
+            );
+            ''',
+            '''
+            create table if not exists circuit_breakers (
+                bot_type text primary key,
+                state text,
+                failures integer,
+                opened_at real,
+                updated_at text default current_timestamp
+            );
             '''
         ] 
 
-        with contextlib.closing(sqlite3.connect(self.db)) as conn:
+        with contextlib.closing(sqlite3.connect(self.db, timeout=self.timeout)) as conn:
             with conn:
                 for query in queries:
-                    conn.execute(query)
\ No newline at end of file
+                    conn.execute(query)
+
+    def update_schema(self) -> None:
+        """ 
+        Bring a database created by an older version up to date: create any
+        missing tables and add any missing columns. Old rows get the column's
+        default, which matches what the older versions scraped. The search index
+        and the clusters are built for the gigs that are already there.
+        """
+        new_columns = {
+            'jobs': {'location': "text default 'boston'", 'category': "text default 'ggg'", 'filters': 'text'},
+            'gig_data': {'content_hash': 'integer', 'latitude': 'real', 'longitude': 'real'},
+            'job_metrics': {'failed_run_id': 'integer', 'error': 'text'},
+            'gig_details': {'gone_at': 'real'},
+        }
+
+        self.create_table()
+
+        with contextlib.closing(sqlite3.connect(self.db, timeout=self.timeout)) as conn:
+            with conn:
+                for table, columns in new_columns.items():
+                    existing = {row[1] for row in conn.execute(f'pragma table_info({table})')}
+                    for column, column_type in columns.items():
+                        if column not in existing:
+                            conn.execute(f'alter table {table} add column {column} {column_type}')
+                            logger.info(f'Added column {table}.{column}')
+
+                # The search index was just added to a database that already has gigs
+                if (
+                    conn.execute('select exists (select 1 from gig_data)').fetchone()[0]
+                    and not conn.execute('select exists (select 1 from gig_search_docsize)').fetchone()[0]
+                ):
+                    conn.execute("insert into gig_search (gig_search) values ('rebuild')")
+                    logger.info('Built the gig search index')
+
+                # The dedupe tables were just added to a database that already has gigs
+                needs_clusters = (
+                    conn.execute('select exists (select 1 from gig_data)').fetchone()[0]
+                    and not conn.execute('select exists (select 1 from gig_signatures)').fetchone()[0]
+                )
+
+        if needs_clusters:
+            self.rebuild_clusters()
@@ -0,0 +1,71 @@
+from array import array
+import hashlib
+import operator
+import re
+
+
+NUM_PERMUTATIONS: int = 64
+BANDS: int = 16                             # 16 bands of 4 rows: pairs above ~0.5 similarity usually share a bucket
+ROWS: int = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE: int = 4
+SIMILARITY_THRESHOLD: float = 0.7           # Estimated Jaccard similarity to count as the same gig
+
+
+def shingles(text: str) -> set[bytes]:
+    """
+    Args:
+        text: A gig title.
+
+    Returns:
+        The character shingles of the text after lowercasing it and collapsing
+        punctuation and whitespace, so "Movers needed!!" and "movers needed" match.
+    """
+    text = ' '.join(re.findall(r'\w+', (text or '').lower()))
+    if len(text) <= SHINGLE_SIZE:
+        return {text.encode()}
+
+    return {text[i:i + SHINGLE_SIZE].encode() for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text: str) -> array:
+    """
+    Args:
+        text: A gig title.
+
+    Returns:
+        The MinHash signature of the title: for each of the hash functions, the 
+        smallest hash of its shingles. Two signatures agree in about as many places
+        as the Jaccard similarity of the two shingle sets.
+    """
+    # One SHAKE digest per shingle gives all the 32 bit hash functions at once, and
+    # the min per position runs in C instead of a Python loop per hash function.
+    hashes = [
+        array('I', hashlib.shake_128(shingle).digest(4 * NUM_PERMUTATIONS))
+        for shingle in shingles(text)
+    ]
+
+    return array('I', map(min, zip(*hashes)))
+
+
+def lsh_buckets(signature: array) -> list[int]:
+    """
+    Args:
+        signature: A MinHash signature.
+
+    Returns:
+        One bucket key per band (signed 64 bit, the range of a SQLite integer). Similar
+        titles share at least one bucket, so only gigs in the same buckets are compared.
+    """
+    return [
+        int.from_bytes(
+            hashlib.blake2b(bytes([band]) + signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest(),
+            'big',
+            signed=True
+        )
+        for band in range(BANDS)
+    ]
+
+
+def similarity(signature: array, other: array) -> float:
+    """ Returns: The estimated Jaccard similarity of two signatures. """
+    return sum(map(operator.eq, signature, other)) / NUM_PERMUTATIONS
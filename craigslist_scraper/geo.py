@@ -0,0 +1,60 @@
+import math
+import re
+
+
+EARTH_RADIUS_MILES: float = 3958.8
+MILES_PER_DEGREE_LATITUDE: float = math.pi * EARTH_RADIUS_MILES / 180
+
+# The location field of a v8 /batch posting: "<area>[:<subarea>]~<latitude>~<longitude>"
+LOCATION_PATTERN: re.Pattern = re.compile(r'^\d+(?::\d+)?~(-?\d+(?:\.\d+)?)~(-?\d+(?:\.\d+)?)')
+
+
+def parse_coordinates(posting: list) -> tuple[float, float] | tuple[None, None]:
+    """
+    Args:
+        posting: One posting array of a v8 /batch response. The location field
+            isn't always at the same index, so every string is checked.
+
+    Returns:
+        (latitude, longitude), or (None, None) if the posting has no location.
+    """
+    for value in posting:
+        if isinstance(value, str):
+            match = LOCATION_PATTERN.match(value)
+            if match:
+                return float(match[1]), float(match[2])
+
+    return None, None
+
+
+def distance_miles(latitude: float, longitude: float, other_latitude: float, other_longitude: float) -> float:
+    """ Returns: The great-circle (haversine) distance between two points in miles. """
+    lat1, lon1, lat2, lon2 = map(math.radians, (latitude, longitude, other_latitude, other_longitude))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude: float, longitude: float, miles: float) -> tuple[float, float, float, float]:
+    """
+    Args:
+        latitude, longitude: The center.
+        miles: The radius.
+
+    Returns:
+        (min latitude, max latitude, min longitude, max longitude) of a box that
+        holds every point within the radius. Near the poles or the antimeridian the
+        box covers every longitude, which is still correct, just less selective.
+    """
+    delta_latitude = miles / MILES_PER_DEGREE_LATITUDE
+    min_latitude, max_latitude = max(-90.0, latitude - delta_latitude), min(90.0, latitude + delta_latitude)
+
+    widest = max(abs(min_latitude), abs(max_latitude))
+    if widest >= 90.0:
+        return min_latitude, max_latitude, -180.0, 180.0
+
+    delta_longitude = miles / (MILES_PER_DEGREE_LATITUDE * math.cos(math.radians(widest)))
+    if longitude - delta_longitude < -180.0 or longitude + delta_longitude > 180.0:
+        return min_latitude, max_latitude, -180.0, 180.0
+
+    return min_latitude, max_latitude, longitude - delta_longitude, longitude + delta_longitude
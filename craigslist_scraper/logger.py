@@ -1,8 +1,66 @@
 import logging
 import logging.config
+import logging.handlers
+import datetime
+import atexit
+import queue
+import json
 import os
 
 
+_log_file: str = None
+_listener: logging.handlers.QueueListener = None
+
+# Arguments of these types can't change while a record waits in the queue
+_IMMUTABLE_ARG_TYPES: tuple[type, ...] = (str, int, float, bool, bytes, type(None))
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """ Formats every record as one JSON object per line. """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'name': record.name,
+            'level': record.levelname,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that leaves the formatting to the listener thread.
+
+    The standard QueueHandler formats the message in the thread that logs it,
+    which would put formatting every message back on the scraping hot path.
+    Here a message is only formatted right away if one of its arguments is 
+    mutable: by the time the listener gets to it, an object like the session's
+    cookie jar may have changed, or be in the middle of being changed by 
+    another worker thread. The traceback is rendered here too, so that the 
+    record doesn't keep the frames alive while it waits in the queue.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # A single dict argument is kept as record.args itself, so it's mutable too
+        if (
+            not isinstance(record.msg, str)
+            or isinstance(record.args, dict)
+            or not all(isinstance(arg, _IMMUTABLE_ARG_TYPES) for arg in record.args or ())
+        ):
+            record.msg = record.getMessage()
+            record.args = None
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
 def _get_next_log_number(log_directory: str) -> int:
     """ Helper method for logger configure_logger(). """
     log_files = [f for f in os.listdir(log_directory) if f.startswith("log_") and f.endswith(".log")]
@@ -19,14 +77,69 @@ def _get_next_log_number(log_directory: str) -> int:
     return max_number + 1
 
 
-def configure_logger() -> None:
-    """ Set up the logger. """            
-    log_directory = "./logs"
+def configure_logger(
+        log_directory: str = './logs',
+        use_queue: bool = False,
+        json_lines: bool = False,
+        max_bytes: int = None,
+        when: str = None,
+        backup_count: int = 7
+    ) -> str:
+    """ 
+    Set up the logger. 
+
+    By default every start gets a new log_N.log file. If max_bytes or when is
+    set, a single scraper.log file is rotated by size or time instead, which is
+    what a long running daemon wants.
+
+    Args:
+        log_directory: Where the log files go.
+        use_queue: Log through a queue; a background thread does the formatting
+            and the writing, so logging never blocks the scraping.
+        json_lines: Write the log file as JSON lines instead of plain text.
+        max_bytes: Rotate the log file once it is this big.
+        when: Rotate the log file on this schedule (see TimedRotatingFileHandler,
+            e.g. 'midnight').
+        backup_count: How many rotated log files to keep.
+
+    Returns:
+        The path of the log file.
+    """            
+    global _log_file
+
+    stop_logger()
+
     if not os.path.exists(log_directory):
         os.makedirs(log_directory)
 
-    log_number = _get_next_log_number(log_directory)
-    log_filename = os.path.join(log_directory, f"log_{log_number}.log")
+    extension = 'jsonl' if json_lines else 'log'
+    if max_bytes or when:
+        log_filename = os.path.join(log_directory, f'scraper.{extension}')
+    else:
+        log_number = _get_next_log_number(log_directory)
+        log_filename = os.path.join(log_directory, f"log_{log_number}.{extension}")
+
+    file_handler = {
+        'class': 'logging.FileHandler',
+        'level': 'DEBUG',
+        'formatter': 'json' if json_lines else 'standard',
+        'filename': log_filename,
+        'mode': 'w',
+    }
+    if when:
+        file_handler.update({
+            'class': 'logging.handlers.TimedRotatingFileHandler',
+            'when': when,
+            'backupCount': backup_count,
+        })
+        del file_handler['mode']
+    elif max_bytes:
+        file_handler.update({
+            'class': 'logging.handlers.RotatingFileHandler',
+            'maxBytes': max_bytes,
+            'backupCount': backup_count,
+            'mode': 'a',
+        })
 
     logging_config = {
         'version': 1,
@@ -35,15 +148,12 @@ def configure_logger() -> None:
             'standard': {
                 'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             },
+            'json': {
+                '()': JsonLinesFormatter,
+            },
         },
         'handlers': {
-            'file_handler': {
-                'class': 'logging.FileHandler',
-                'level': 'DEBUG',
-                'formatter': 'standard',
-                'filename': log_filename,
-                'mode': 'w',
-            },
+            'file_handler': file_handler,
             'console': {
                 'class': 'logging.StreamHandler',
                 'level': 'INFO',
@@ -58,3 +168,92 @@ def configure_logger() -> None:
     }
 
     logging.config.dictConfig(logging_config)
+
+    if use_queue:
+        _start_queue_listener()
+
+    _log_file = log_filename
+    return log_filename
+
+
+def _start_queue_listener() -> None:
+    """ Move the root handlers behind a queue that a background thread empties. """
+    global _listener
+
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    log_queue = queue.SimpleQueue()
+
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logger)
+
+
+def _own_log_files_after_fork() -> None:
+    """
+    A forked child (e.g. a queue worker process) inherits the parent's rotating
+    file handler. If every process rolled the same scraper.log over, they would
+    overwrite each other's backups, so the child writes to (and rotates) a file
+    of its own instead, e.g. scraper.<pid>.log. Only the parent rotates 
+    scraper.log.
+    """
+    global _log_file
+
+    handlers = _listener.handlers if _listener is not None else logging.getLogger().handlers
+    for handler in handlers:
+        if not isinstance(handler, logging.handlers.BaseRotatingHandler):
+            continue
+
+        root, extension = os.path.splitext(handler.baseFilename)
+        filename = f'{root}.{os.getpid()}{extension}'
+        if _log_file is not None and os.path.abspath(_log_file) == handler.baseFilename:
+            _log_file = filename
+
+        handler.baseFilename = filename
+        if handler.stream is not None:
+            handler.stream.close()
+            handler.stream = handler._open()
+
+
+def _restart_queue_listener_after_fork() -> None:
+    """ 
+    The listener thread doesn't survive a fork, so a forked child (e.g. a queue
+    worker process) starts its own.
+    """
+    global _listener
+
+    if _listener is None:
+        return
+
+    handlers = _listener.handlers
+    _listener = None
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+
+    _start_queue_listener()
+
+
+os.register_at_fork(after_in_child=_own_log_files_after_fork)
+os.register_at_fork(after_in_child=_restart_queue_listener_after_fork)
+
+
+def stop_logger() -> None:
+    """ Flush the queue (if logging through one) and stop the listener thread. """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_log_file() -> str | None:
+    """ Returns: The current log file, or None if the logger isn't configured. """
+    return _log_file
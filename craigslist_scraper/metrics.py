@@ -0,0 +1,215 @@
+from typing import Iterator
+import contextlib
+import threading
+import logging
+import os
+
+from .clock import Clock, REAL_CLOCK
+
+
+logger = logging.getLogger(__name__)
+
+
+class JobMetrics:
+    """
+    Collects the timings of one scraping job: how long each phase took (cookie,
+    /full, each /batch, parsing, DB insert...) and the latency, status code and
+    size of every request. The bots and the Client share one instance per job,
+    and it is stored in the job_metrics table at the end of the job.
+    """
+    def __init__(self, clock: Clock = None):
+        """
+        Args:
+            clock: Where the timestamps and durations come from. Defaults to the 
+                real clock; with a VirtualClock the phases include the skipped sleeps.
+
+        Attrs:
+            phases: A list of phase dicts (name, detail, started_at, duration, error).
+            requests: A list of request dicts (name, detail, bot_used, started_at,
+                duration, status, bytes).
+            clock: See Args.
+            lock: The bots record from several threads.
+        """
+        self.clock: Clock = clock or REAL_CLOCK
+        self.phases: list[dict[str, str | float]] = []
+        self.requests: list[dict[str, str | float | int]] = []
+        self.lock = threading.Lock()
+        self._stored: tuple[int, int] = (0, 0)
+
+    @contextlib.contextmanager
+    def phase(self, name: str, detail: str = None) -> Iterator[None]:
+        """
+        Time the code inside the with block. The phase is recorded even if the
+        code raises, with the name of the error, so failed runs and failed bots
+        show where they spent their time too.
+
+        Args:
+            name: The phase, e.g. 'batch'.
+            detail: Anything that tells two phases with the same name apart, 
+                e.g. 'start=0 count=1080'.
+        """
+        started_at = self.clock.time()
+        start = self.clock.monotonic()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            with self.lock:
+                self.phases.append({
+                    'name': name,
+                    'detail': detail,
+                    'started_at': started_at,
+                    'duration': self.clock.monotonic() - start,
+                    'error': error
+                })
+
+    def record_request(
+            self,
+            name: str,
+            url: str,
+            bot_used: str,
+            duration: float,
+            status: int = None,
+            size: int = None
+        ) -> None:
+        """
+        Args:
+            name: What the request was for, e.g. 'full' or 'posting'.
+            url: The requested url.
+            bot_used: The bot that sent the request.
+            duration: The latency of the request in seconds.
+            status: The HTTP status code, if known.
+            size: The size of the response body in bytes, if known.
+        """
+        with self.lock:
+            self.requests.append({
+                'name': name,
+                'detail': url,
+                'bot_used': bot_used,
+                'started_at': self.clock.time() - duration,
+                'duration': duration,
+                'status': status,
+                'bytes': size
+            })
+
+    def take_unstored(self) -> tuple[list[dict[str, str | float]], list[dict[str, str | float | int]]]:
+        """
+        The metrics are stored in parts: what was recorded up to the job's insert
+        goes into the job's transaction, the rest (e.g. the enrichment) afterwards.
+
+        Returns:
+            The phases and the requests recorded since the last call, for the 
+            caller to store.
+        """
+        with self.lock:
+            phases, requests = self.phases[self._stored[0]:], self.requests[self._stored[1]:]
+            self._stored = (len(self.phases), len(self.requests))
+        return phases, requests
+
+    def phase_totals(self) -> dict[str, float]:
+        """ Returns: The total seconds spent in each phase name. """
+        totals = {}
+        with self.lock:
+            for phase in self.phases:
+                totals[phase['name']] = totals.get(phase['name'], 0) + phase['duration']
+        return totals
+
+
+class PrometheusExporter:
+    """
+    Writes the metrics of the latest job of every location and category to a 
+    file for the node_exporter textfile collector.
+    """
+    def __init__(self, path: str, clock: Clock = None):
+        """
+        Args:
+            path: The .prom file to write. It is replaced atomically.
+            clock: Where the timestamps come from. Defaults to the real clock.
+
+        Attrs:
+            latest: The latest JobMetrics and gig count per (location, category).
+            failures: The number of failed runs and the time of the last one per
+                (location, category).
+        """
+        self.path: str = path
+        self.clock: Clock = clock or REAL_CLOCK
+        self.latest: dict[tuple[str, str], tuple[JobMetrics, int, float]] = {}
+        self.failures: dict[tuple[str, str], tuple[int, float]] = {}
+        self.lock = threading.Lock()
+
+    def export(self, location: str, category: str, metrics: JobMetrics, gig_count: int) -> None:
+        """ Store the metrics of a finished job and rewrite the file. """
+        with self.lock:
+            self.latest[(location, category)] = (metrics, gig_count, self.clock.time())
+            self._write()
+
+    def export_failure(self, location: str, category: str) -> None:
+        """ Count a failed run and rewrite the file. The metrics of the latest job stay. """
+        with self.lock:
+            count, _ = self.failures.get((location, category), (0, None))
+            self.failures[(location, category)] = (count + 1, self.clock.time())
+            self._write()
+
+    def _write(self) -> None:
+        """ Replace the file with the current metrics (called with the lock held). """
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+        logger.debug(f'Wrote Prometheus metrics to {self.path}')
+
+    FAMILIES: dict[str, str] = {
+        'craigslist_scraper_phase_duration_seconds': 'Time spent in each phase of the latest job.',
+        'craigslist_scraper_requests': 'Requests sent during the latest job.',
+        'craigslist_scraper_request_duration_seconds': 'Total latency of the requests of the latest job.',
+        'craigslist_scraper_response_bytes': 'Total size of the responses of the latest job.',
+        'craigslist_scraper_gigs': 'Gigs scraped by the latest job.',
+        'craigslist_scraper_last_success_timestamp_seconds': 'When the latest job finished.',
+        'craigslist_scraper_failed_runs': 'Runs that failed since the scraper started.',
+        'craigslist_scraper_last_failure_timestamp_seconds': 'When the latest failed run failed.',
+    }
+
+    def render(self) -> str:
+        """ Returns: The metrics in the Prometheus text format. """
+        samples = {family: [] for family in self.FAMILIES}
+
+        for (location, category), (metrics, gig_count, finished_at) in self.latest.items():
+            job_labels = f'location="{location}",category="{category}"'
+
+            for phase, duration in metrics.phase_totals().items():
+                samples['craigslist_scraper_phase_duration_seconds'].append(
+                    (f'{job_labels},phase="{phase}"', duration)
+                )
+
+            grouped = {}
+            with metrics.lock:
+                for request in metrics.requests:
+                    key = (request['bot_used'], request['name'], request['status'])
+                    count, duration, size = grouped.get(key, (0, 0, 0))
+                    grouped[key] = (count + 1, duration + request['duration'], size + (request['bytes'] or 0))
+
+            for (bot_used, name, status), (count, duration, size) in grouped.items():
+                labels = f'{job_labels},bot="{bot_used}",request="{name}",status="{status}"'
+                samples['craigslist_scraper_requests'].append((labels, count))
+                samples['craigslist_scraper_request_duration_seconds'].append((labels, duration))
+                samples['craigslist_scraper_response_bytes'].append((labels, size))
+
+            samples['craigslist_scraper_gigs'].append((job_labels, gig_count))
+            samples['craigslist_scraper_last_success_timestamp_seconds'].append((job_labels, finished_at))
+
+        for (location, category), (count, failed_at) in self.failures.items():
+            job_labels = f'location="{location}",category="{category}"'
+            samples['craigslist_scraper_failed_runs'].append((job_labels, count))
+            samples['craigslist_scraper_last_failure_timestamp_seconds'].append((job_labels, failed_at))
+
+        lines = []
+        for family, help_text in self.FAMILIES.items():
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} gauge')
+            lines += [f'{family}{{{labels}}} {value}' for labels, value in samples[family]]
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,206 @@
+from collections import Counter
+from pathlib import Path
+from typing import Iterator
+import contextlib
+import tracemalloc
+import threading
+import cProfile
+import datetime
+import logging
+import time
+import sys
+import re
+
+from .logger import get_log_file
+
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler(threading.Thread):
+    """
+    A wall-clock sampling profiler. Every interval it looks at the stack of every
+    other thread and counts it, so time spent waiting (on the network, Chrome or
+    a lock) shows up as well as CPU time. The overhead only depends on the interval,
+    not on how many function calls the job makes.
+    """
+    def __init__(self, interval: float = 0.005):
+        """
+        Args:
+            interval: Seconds between two samples.
+
+        Attrs:
+            stacks: How many times each folded stack ("thread;outer;...;inner") was seen.
+            samples: The number of samples taken.
+        """
+        super().__init__(name='profiler-sampler', daemon=True)
+        self.interval: float = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples: int = 0
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})')
+                    frame = frame.f_back
+
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+            self.samples += 1
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.join()
+
+    def write_folded(self, path: Path) -> None:
+        """ Write the stacks in the folded format of flamegraph.pl, speedscope, etc. """
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class Profiler:
+    """
+    Profiles scraping runs. The profile and a report of the top allocations of
+    each phase are written next to the log file of the run.
+
+    Only one run is profiled at a time (cProfile and tracemalloc are process
+    wide); runs that start while another one is being profiled run normally.
+    """
+    MODES: tuple[str, ...] = ('cprofile', 'sampling')
+
+    def __init__(
+            self,
+            mode: str = 'sampling',
+            interval: float = 0.005,
+            trace_memory: bool = True,
+            top_allocations: int = 15
+        ):
+        """
+        Args:
+            mode: 'cprofile' counts every function call of the thread that runs the
+                job (exact, but slower, and the bots' worker threads aren't included),
+                writing a .prof file for snakeviz/flameprof/tuna. 'sampling' samples
+                the stacks of all threads, writing folded stacks for flamegraph.pl or
+                speedscope; it's cheap enough for production.
+            interval: Seconds between two samples in sampling mode.
+            trace_memory: Take tracemalloc snapshots around the phases of the run.
+            top_allocations: The number of lines in the report for each phase.
+
+        Attrs:
+            memory_report: The lines of the allocation report of the current run.
+            lock: Held while a run is profiled.
+        """
+        if mode not in Profiler.MODES:
+            raise ValueError(f'Unknown profiling mode {mode!r}, expected one of {Profiler.MODES}')
+
+        self.mode: str = mode
+        self.interval: float = interval
+        self.trace_memory: bool = trace_memory
+        self.top_allocations: int = top_allocations
+
+        self.memory_report: list[str] = []
+        self.lock = threading.Lock()
+        self._owner: int = None
+
+    @contextlib.contextmanager
+    def profile(self, label: str) -> Iterator[None]:
+        """
+        Profile the code inside the with block.
+
+        Args:
+            label: Goes into the file names, e.g. 'boston_ggg'.
+        """
+        label = re.sub(r'[^\w-]+', '_', label)
+        if not self.lock.acquire(blocking=False):
+            logger.info(f'Another run is being profiled, not profiling {label}')
+            yield
+            return
+
+        self._owner = threading.get_ident()
+        self.memory_report = []
+        base = self._output_base(label)
+
+        if self.trace_memory:
+            tracemalloc.start()
+
+        if self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(self.interval)
+            profiler.start()
+
+        start = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            if self.mode == 'cprofile':
+                profiler.disable()
+                profile_path = base.with_suffix('.prof')
+                profiler.dump_stats(profile_path)
+            else:
+                profiler.stop()
+                profile_path = base.with_suffix('.folded')
+                profiler.write_folded(profile_path)
+
+            logger.info(f'Profiled {label} for {time.perf_counter() - start:.2f}s: {profile_path}')
+
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.memory_report.insert(0, f'Traced memory: {current / 1e6:.1f} MB at the end, {peak / 1e6:.1f} MB peak\n')
+
+                memory_path = base.with_name(base.name + '_memory.txt')
+                memory_path.write_text('\n'.join(self.memory_report))
+                logger.info(f'Wrote the top allocations to {memory_path}')
+
+            self._owner = None
+            self.lock.release()
+
+    @contextlib.contextmanager
+    def track(self, phase: str) -> Iterator[None]:
+        """
+        Add the top allocations made inside the with block to the memory report.
+        Does nothing unless it is called by the run that is being profiled.
+
+        Args:
+            phase: The name of the phase in the report, e.g. 'scrape'.
+        """
+        if self._owner != threading.get_ident() or not tracemalloc.is_tracing():
+            yield
+            return
+
+        before = tracemalloc.take_snapshot()
+        try:
+            yield
+        finally:
+            stats = tracemalloc.take_snapshot().compare_to(before, 'lineno')
+            self.memory_report.append(f'Top allocations of {phase}:')
+            self.memory_report.extend(f'    {stat}' for stat in stats[:self.top_allocations])
+            self.memory_report.append('')
+
+    @staticmethod
+    def _output_base(label: str) -> Path:
+        """ 
+        Returns: The path of the output files without the suffix, next to the log file.
+            The timestamp goes down to the microsecond so the runs of one log file
+            that start in the same second don't overwrite each other's files.
+        """
+        log_file = get_log_file()
+        directory = Path(log_file).parent if log_file else Path('logs')
+        prefix = Path(log_file).stem if log_file else 'profile'
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+        return directory / f'{prefix}_{label}_{timestamp}'
@@ -0,0 +1,158 @@
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+import threading
+import logging
+import signal
+import random
+
+from .client import Client
+from .clock import Clock, REAL_CLOCK
+from .search import Search
+
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledJob:
+    """ One location and category (or searches) that is scraped every "interval" seconds. """
+    def __init__(
+            self,
+            location: str,
+            category: str = 'ggg',
+            interval: float = 3600,
+            jitter: float = 300,
+            searches: list[Search] = None
+        ):
+        """
+        Args:
+            location: The Craigslist subdomain to scrape.
+            category: The Craigslist search path to scrape.
+            interval: Seconds between the start of two runs.
+            jitter: Every run is moved by a random amount of up to this many 
+                seconds (either way) so the runs don't happen like clockwork.
+            searches: Scrape these searches with one API session (see 
+                Client.run_searches) instead of the category.
+
+        Attrs:
+            next_run: The monotonic time (of the scheduler's clock) after which the job is due.
+                None until the scheduler starts, which makes new jobs due straight away.
+            future: The future of the current (or last) run.
+        """
+        self.location: str = location
+        self.category: str = category
+        self.interval: float = interval
+        self.jitter: float = jitter
+        self.searches: list[Search] | None = searches
+
+        self.next_run: float = None
+        self.future: Future = None
+
+    def __repr__(self) -> str:
+        target = ', '.join(map(repr, self.searches)) if self.searches else self.category
+        return f'ScheduledJob({self.location}/{target}, every {self.interval}s)'
+
+    def is_running(self) -> bool:
+        return self.future is not None and not self.future.done()
+
+    def schedule_next(self, now: float) -> None:
+        """ 
+        Set next_run to one interval (plus or minus the jitter) from now. 
+        
+        Args:
+            now: The monotonic time of the scheduler's clock.
+        """
+        delay = self.interval + random.uniform(-self.jitter, self.jitter)
+        self.next_run = now + max(delay, 0)
+
+
+class Scheduler:
+    """
+    Runs the scraper as a long running process instead of one process per run.
+
+    One Client is shared by all of the jobs, so the HTTP sessions (one per location 
+    and category) and the database connection stay warm between runs. Every job runs in its own thread. If a
+    job is still running when it is due again, that run is skipped. SIGTERM and 
+    SIGINT stop the scheduler after the runs in progress have finished.
+    """
+    def __init__(
+            self,
+            jobs: list[ScheduledJob],
+            db_file: str = 'database.db',
+            clock: Clock = None,
+            **client_kwargs
+        ):
+        """
+        Args:
+            jobs: The jobs to run.
+            db_file: The SQLite database to store the data in.
+            clock: What the scheduler waits with. Also passed on to the Client.
+                Defaults to the real clock.
+            **client_kwargs: Passed on to the Client (e.g. hedge_after).
+
+        Attrs:
+            client: The Client shared by every job.
+            stop_event: Set when the scheduler should shut down.
+            clock: See Args.
+        """
+        self.jobs: list[ScheduledJob] = jobs
+        self.clock: Clock = clock or REAL_CLOCK
+        self.client: Client = Client(db_file, reuse_sessions=True, clock=self.clock, **client_kwargs)
+        self.stop_event = threading.Event()
+
+    def run_forever(self) -> None:
+        """ Start the jobs as they become due until stop() is called. """
+        self._install_signal_handlers()
+        logger.info(f'Starting scheduler with jobs: {self.jobs}')
+
+        for job in self.jobs:
+            if job.next_run is None:
+                job.next_run = self.clock.monotonic()
+
+        with ThreadPoolExecutor(max_workers=len(self.jobs), thread_name_prefix='job') as executor:
+            while not self.stop_event.is_set():
+                for job in self.jobs:
+                    if job.next_run > self.clock.monotonic():
+                        continue
+
+                    if job.is_running():
+                        logger.warning(f'{job} is still running. Skipping this run')
+                    else:
+                        job.future = executor.submit(self._run_job, job)
+
+                    job.schedule_next(self.clock.monotonic())
+
+                if self.clock.virtual:
+                    # Virtual time would race past runs that are still going, so let them finish first
+                    wait([job.future for job in self.jobs if job.is_running()])
+
+                next_run = min(job.next_run for job in self.jobs)
+                self.clock.wait(self.stop_event, max(next_run - self.clock.monotonic(), 0))
+
+            logger.info('Waiting for the running jobs to finish')
+
+        self.client.close()
+        logger.info('Scheduler stopped')
+
+    def stop(self, *_) -> None:
+        """ Ask the scheduler to shut down. Also used as the signal handler. """
+        logger.info('Received stop signal')
+        self.stop_event.set()
+
+    def _run_job(self, job: ScheduledJob) -> None:
+        """ Run one job. Errors are logged so that they don't kill the daemon. """
+        try:
+            if job.searches:
+                self.client.run_searches(location=job.location, searches=job.searches)
+            else:
+                self.client.run(location=job.location, category=job.category)
+
+        except Exception as e:
+            logger.exception(e)
+            logger.error(f'{job} failed')
+
+    def _install_signal_handlers(self) -> None:
+        """ Signal handlers can only be set from the main thread. """
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
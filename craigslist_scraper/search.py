@@ -0,0 +1,57 @@
+from urllib.parse import parse_qsl, urlencode
+
+
+class Search:
+    """
+    One Craigslist search: a category (search path) and the query string filters
+    that go with it. Several searches can be scraped with one APIBot session.
+
+    Class Attrs:
+        DEFAULT_FILTERS: The filters used when none are given. Only paid gigs are
+            scraped by default, like the bots always did.
+    """
+    DEFAULT_FILTERS: dict[str, dict[str, str]] = {'ggg': {'is_paid': 'yes'}}
+
+    def __init__(self, search_path: str = 'ggg', filters: dict[str, str] = None):
+        """
+        Args:
+            search_path: The Craigslist category, e.g. 'ggg' for gigs or 'jjj' for jobs.
+            filters: Query string parameters for the search, e.g. {'is_paid': 'no'}.
+                Defaults to DEFAULT_FILTERS of the category.
+
+        Attrs:
+            search_path: See Args.
+            filters: See Args.
+        """
+        self.search_path: str = search_path
+        self.filters: dict[str, str] = dict(
+            filters if filters is not None else Search.DEFAULT_FILTERS.get(search_path, {})
+        )
+
+    @classmethod
+    def from_string(cls, text: str) -> 'Search':
+        """
+        Args:
+            text: A search like on the command line, 'ggg' or 'ggg?is_paid=no'.
+        """
+        search_path, _, query = text.partition('?')
+        return cls(search_path, dict(parse_qsl(query)) if query else None)
+
+    @property
+    def filter_string(self) -> str | None:
+        """
+        The filters as stored in jobs.filters, or None for the default filters
+        (so jobs from before there were filters compare with the new ones).
+        """
+        if self.filters == Search.DEFAULT_FILTERS.get(self.search_path, {}):
+            return None
+        return urlencode(sorted(self.filters.items()))
+
+    def __repr__(self) -> str:
+        return f'{self.search_path}?{urlencode(sorted(self.filters.items()))}' if self.filters else self.search_path
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Search) and repr(self) == repr(other)
+
+    def __hash__(self) -> int:
+        return hash(repr(self))
@@ -0,0 +1,159 @@
+import logging
+
+from .db_manager import DBHandler
+from .clock import Clock, REAL_CLOCK
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Tracks whether a bot type is currently working.
+
+    States:
+        closed: The bot works. Every failure is counted and once there are
+            failure_threshold failures in a row the breaker opens.
+        open: The bot is skipped until cooldown seconds have passed.
+        half_open: The cooldown is over and the next run is allowed to try
+            the bot again. Success closes the breaker, failure opens it again.
+    """
+    CLOSED: str = 'closed'
+    OPEN: str = 'open'
+    HALF_OPEN: str = 'half_open'
+
+    def __init__(
+            self,
+            bot_type: str,
+            state: str = CLOSED,
+            failures: int = 0,
+            opened_at: float = None,
+            failure_threshold: int = 2,
+            cooldown: float = 6 * 3600
+        ):
+        """
+        Args:
+            bot_type: One of the keys of Client.bots.
+            state: One of CLOSED, OPEN or HALF_OPEN.
+            failures: The number of failures in a row.
+            opened_at: Unix time of when the breaker last opened.
+            failure_threshold: How many failures in a row open the breaker.
+            cooldown: How many seconds the breaker stays open.
+        """
+        self.bot_type: str = bot_type
+        self.state: str = state
+        self.failures: int = failures
+        self.opened_at: float = opened_at
+        self.failure_threshold: int = failure_threshold
+        self.cooldown: float = cooldown
+
+    def __repr__(self) -> str:
+        return f'CircuitBreaker({self.bot_type}: {self.state}, {self.failures} failures)'
+
+    def allows_request(self, now: float) -> bool:
+        """ 
+        Returns:
+            True if the bot should be tried. Moves an open breaker whose cooldown
+            is over to half open.
+        """
+        if self.state == CircuitBreaker.OPEN and now - self.opened_at >= self.cooldown:
+            self.state = CircuitBreaker.HALF_OPEN
+
+        return self.state != CircuitBreaker.OPEN
+
+    def record_success(self) -> None:
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self, now: float) -> None:
+        self.failures += 1
+
+        if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = CircuitBreaker.OPEN
+            self.opened_at = now
+
+
+class StrategySelector:
+    """
+    Decides which bots to try (and in which order) for a run.
+
+    The circuit breakers are stored in the database rather than in memory, so 
+    that the next run (or another process) knows that, for example, the API has 
+    been failing for hours and goes straight to the bot that is currently working.
+    """
+    def __init__(
+            self,
+            db: DBHandler,
+            order: tuple[str, ...] = ('api', 'html', 'selenium'),
+            failure_threshold: int = 2,
+            cooldown: float = 6 * 3600,
+            clock: Clock = None
+        ):
+        """
+        Args:
+            db: Where the circuit breakers are stored.
+            order: The bot types from the cheapest to the most expensive.
+            failure_threshold: See CircuitBreaker.
+            cooldown: See CircuitBreaker.
+            clock: Where the time comes from. Defaults to the real clock.
+        """
+        self.db: DBHandler = db
+        self.order: tuple[str, ...] = order
+        self.failure_threshold: int = failure_threshold
+        self.cooldown: float = cooldown
+        self.clock: Clock = clock or REAL_CLOCK
+
+    def plan(self) -> list[str]:
+        """
+        Returns:
+            The bot types to try, in order, skipping the ones with an open breaker.
+            The last bot type is always tried if every breaker is open.
+        """
+        now = self.clock.time()
+        plan = [bot_type for bot_type in self.order if self.get_breaker(bot_type).allows_request(now)]
+
+        if not plan:
+            logger.warning('Every circuit breaker is open. Using the last resort')
+            plan = [self.order[-1]]
+
+        skipped = [bot_type for bot_type in self.order if bot_type not in plan]
+        if skipped:
+            logger.info(f'Skipping bots with an open circuit breaker: {skipped}')
+
+        return plan
+
+    def allows(self, bot_type: str) -> bool:
+        """ Returns: True if the breaker of bot_type is not open. """
+        return self.get_breaker(bot_type).allows_request(self.clock.time())
+
+    def record_success(self, bot_type: str) -> None:
+        breaker = self.get_breaker(bot_type)
+        breaker.record_success()
+        self.save_breaker(breaker)
+
+    def record_failure(self, bot_type: str) -> None:
+        breaker = self.get_breaker(bot_type)
+        breaker.record_failure(self.clock.time())
+        self.save_breaker(breaker)
+
+        if breaker.state == CircuitBreaker.OPEN:
+            logger.warning(f'Opened the circuit breaker for {bot_type} for {self.cooldown} seconds')
+
+    def get_breaker(self, bot_type: str) -> CircuitBreaker:
+        """ Load the breaker of a bot type from the database. """
+        row = self.db.get_circuit_breaker(bot_type) or {}
+        return CircuitBreaker(
+            bot_type,
+            failure_threshold=self.failure_threshold,
+            cooldown=self.cooldown,
+            **row
+        )
+
+    def save_breaker(self, breaker: CircuitBreaker) -> None:
+        self.db.save_circuit_breaker(
+            bot_type=breaker.bot_type,
+            state=breaker.state,
+            failures=breaker.failures,
+            opened_at=breaker.opened_at
+        )
@@ -0,0 +1,505 @@
+from typing import Iterator
+import multiprocessing
+import contextlib
+import threading
+import logging
+import sqlite3
+import socket
+import signal
+import time
+import uuid
+import os
+
+from .client import Client
+
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLostError(Exception):
+    """ The worker's lease on the task expired and the task may be running somewhere else. """
+    pass
+
+
+class Task:
+    """ One scrape of a location and category, optionally with a specific bot. """
+    def __init__(self, id: int, location: str, category: str, bot_type: str | None, attempts: int):
+        self.id: int = id
+        self.location: str = location
+        self.category: str = category
+        self.bot_type: str | None = bot_type
+        self.attempts: int = attempts
+
+    def __repr__(self) -> str:
+        return f'Task({self.id}: {self.location}/{self.category}, bot={self.bot_type or "any"})'
+
+
+class WorkQueue:
+    """
+    A work queue of scraping tasks stored in a SQLite database.
+
+    Workers (in other processes on the same machine) claim tasks with a lease.
+    While a worker runs a task it keeps extending the lease with heartbeats. If
+    a worker dies, its lease expires and the task is put back in the queue the
+    next time any worker looks for work. A worker only stores its job if it still
+    holds the lease, so a task that was handed to another worker isn't stored twice.
+
+    The queue uses SQLite's WAL mode, which needs shared memory, so the queue and
+    the database must not be on a network filesystem. To spread the work over
+    several machines, give each machine its own queue and database.
+
+    Task statuses: pending -> running -> done, or back to pending (after a 
+    growing retry delay) on failure until max_attempts is reached, then failed.
+    """
+    def __init__(
+            self,
+            path: str = 'queue.db',
+            lease_seconds: float = 900,
+            max_attempts: int = 3,
+            retry_delay: float = 600
+        ):
+        """
+        Args:
+            path: The SQLite file of the queue. It is created if it doesn't exist.
+            lease_seconds: How long a claimed task belongs to a worker without
+                a heartbeat.
+            max_attempts: How many times a task is tried before it is marked failed.
+            retry_delay: A failed task waits this many seconds times its number 
+                of attempts before it can be claimed again.
+        """
+        self.path: str = path
+        self.lease_seconds: float = lease_seconds
+        self.max_attempts: int = max_attempts
+        self.retry_delay: float = retry_delay
+        self.create_tables()
+
+    @contextlib.contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """ 
+        Yields a connection in autocommit mode, so that the transactions can be
+        started with "begin immediate" (which takes the write lock straight away).
+        """
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def create_tables(self) -> None:
+        queries = [
+            '''
+            create table if not exists tasks (
+                id integer primary key autoincrement,
+                location text,
+                category text,
+                bot_type text,
+                status text default 'pending',
+                worker_id text,
+                lease_expires real,
+                available_at real default 0,
+                attempts integer default 0,
+                job_id integer,
+                error text,
+                enqueued_at real,
+                started_at real,
+                finished_at real
+            );
+            ''',
+            '''
+            create index if not exists tasks_status on tasks (status, lease_expires);
+            ''',
+            '''
+            create table if not exists workers (
+                worker_id text primary key,
+                hostname text,
+                pid integer,
+                started_at real,
+                last_heartbeat real,
+                tasks_done integer default 0,
+                tasks_failed integer default 0,
+                busy_seconds real default 0
+            );
+            '''
+        ]
+
+        with self.connect() as conn:
+            conn.execute('pragma journal_mode=wal')
+            for query in queries:
+                conn.execute(query)
+
+    def enqueue(self, location: str, category: str = 'ggg', bot_type: str = None) -> int:
+        """
+        Args:
+            location: The Craigslist subdomain to scrape.
+            category: The Craigslist search path to scrape.
+            bot_type: Force a bot (one of the keys of Client.bots). By default 
+                the worker's Client picks one.
+
+        Returns:
+            The id of the new task.
+
+        Raises:
+            UnsupportedLocationError: If the API bot is forced for a location it
+                can't scrape, so the task doesn't fail on every worker later.
+        """
+        if bot_type == 'api':
+            from .bots.api_bot.api_bot import APIBot
+            from .bots.bot_exceptions import UnsupportedLocationError
+
+            if not APIBot.supports(location):
+                raise UnsupportedLocationError(f'The api bot can\'t scrape {location!r} (known: {", ".join(APIBot.LOCATION_CODES)})')
+
+        query = '''
+            insert into tasks
+            (location, category, bot_type, enqueued_at)
+            values
+            (:location, :category, :bot_type, :now);
+        '''
+
+        with self.connect() as conn:
+            cur = conn.execute(query, {
+                'location': location,
+                'category': category,
+                'bot_type': bot_type,
+                'now': time.time()
+            })
+            return cur.lastrowid
+
+    def claim(self, worker_id: str) -> Task | None:
+        """
+        Claim the oldest pending task. Expired leases are put back in the queue first.
+
+        Args:
+            worker_id: The id of the worker claiming the task.
+
+        Returns:
+            The task, or None if the queue is empty.
+        """
+        now = time.time()
+
+        with self.connect() as conn:
+            conn.execute('begin immediate')
+            try:
+                self._requeue_expired(conn, now)
+
+                row = conn.execute('''
+                    select id, location, category, bot_type, attempts
+                    from tasks
+                    where status = 'pending' and available_at <= :now
+                    order by id
+                    limit 1;
+                ''', {'now': now}).fetchone()
+
+                if row is None:
+                    conn.execute('commit')
+                    return None
+
+                conn.execute('''
+                    update tasks
+                    set status = 'running',
+                        worker_id = :worker_id,
+                        lease_expires = :lease_expires,
+                        attempts = attempts + 1,
+                        started_at = :now
+                    where id = :id;
+                ''', {'worker_id': worker_id, 'lease_expires': now + self.lease_seconds, 'now': now, 'id': row[0]})
+                conn.execute('commit')
+
+            except Exception:
+                conn.execute('rollback')
+                raise
+
+        id, location, category, bot_type, attempts = row
+        return Task(id, location, category, bot_type, attempts + 1)
+
+    def heartbeat(self, task_id: int, worker_id: str) -> bool:
+        """
+        Extend the lease of a running task.
+
+        Returns:
+            False if the worker no longer holds the lease (it expired and the task
+            was given to someone else).
+        """
+        now = time.time()
+
+        with self.connect() as conn:
+            cur = conn.execute('''
+                update tasks
+                set lease_expires = :lease_expires
+                where id = :id and worker_id = :worker_id and status = 'running';
+            ''', {'lease_expires': now + self.lease_seconds, 'id': task_id, 'worker_id': worker_id})
+            conn.execute(
+                'update workers set last_heartbeat = :now where worker_id = :worker_id;',
+                {'now': now, 'worker_id': worker_id}
+            )
+
+        return cur.rowcount == 1
+
+    def complete(self, task: Task, worker_id: str, job_id: int) -> None:
+        """ Mark a task as done. """
+        self._finish(task, worker_id, status='done', job_id=job_id, error=None)
+
+    def fail(self, task: Task, worker_id: str, error: str) -> None:
+        """ Put a failed task back in the queue, or mark it failed if it's out of attempts. """
+        status = 'failed' if task.attempts >= self.max_attempts else 'pending'
+        self._finish(task, worker_id, status=status, job_id=None, error=error)
+
+    def _finish(self, task: Task, worker_id: str, status: str, job_id: int | None, error: str | None) -> None:
+        now = time.time()
+        counter = 'tasks_done' if status == 'done' else 'tasks_failed'
+
+        with self.connect() as conn:
+            conn.execute('begin immediate')
+            try:
+                cur = conn.execute('''
+                    update tasks
+                    set status = :status,
+                        worker_id = case when :status = 'pending' then null else worker_id end,
+                        lease_expires = null,
+                        available_at = :now + :retry_delay * attempts,
+                        job_id = :job_id,
+                        error = :error,
+                        finished_at = :now
+                    where id = :id and worker_id = :worker_id and status = 'running';
+                ''', {
+                    'status': status,
+                    'job_id': job_id,
+                    'error': error,
+                    'now': now,
+                    'retry_delay': self.retry_delay,
+                    'id': task.id,
+                    'worker_id': worker_id
+                })
+                still_leased = cur.rowcount == 1
+
+                if still_leased:
+                    conn.execute(f'''
+                        update workers
+                        set {counter} = {counter} + 1,
+                            busy_seconds = busy_seconds + :now - (select started_at from tasks where id = :id),
+                            last_heartbeat = :now
+                        where worker_id = :worker_id;
+                    ''', {'now': now, 'id': task.id, 'worker_id': worker_id})
+                conn.execute('commit')
+
+            except Exception:
+                conn.execute('rollback')
+                raise
+
+        if not still_leased:
+            logger.warning(f'{task} was no longer leased to {worker_id} when it finished')
+
+    def _requeue_expired(self, conn: sqlite3.Connection, now: float) -> int:
+        """ Put the running tasks whose lease has expired back in the queue. """
+        cur = conn.execute('''
+            update tasks
+            set status = case when attempts >= :max_attempts then 'failed' else 'pending' end,
+                worker_id = null,
+                lease_expires = null,
+                error = 'lease expired'
+            where status = 'running' and lease_expires < :now;
+        ''', {'now': now, 'max_attempts': self.max_attempts})
+
+        if cur.rowcount:
+            logger.warning(f'Re-queued {cur.rowcount} tasks with an expired lease')
+        return cur.rowcount
+
+    def register_worker(self, worker_id: str) -> None:
+        now = time.time()
+
+        with self.connect() as conn:
+            conn.execute('''
+                insert into workers
+                (worker_id, hostname, pid, started_at, last_heartbeat)
+                values
+                (:worker_id, :hostname, :pid, :now, :now);
+            ''', {'worker_id': worker_id, 'hostname': socket.gethostname(), 'pid': os.getpid(), 'now': now})
+
+    def status(self) -> dict[str, dict]:
+        """
+        Returns:
+            {
+                'tasks': {status: count, ...},
+                'workers': [{worker_id, hostname, pid, uptime_seconds, 
+                             seconds_since_heartbeat, tasks_done, tasks_failed,
+                             busy_seconds, tasks_per_hour}, ...]
+            }
+        """
+        now = time.time()
+
+        with self.connect() as conn:
+            tasks = dict(conn.execute('select status, count(*) from tasks group by status;').fetchall())
+            rows = conn.execute('''
+                select worker_id, hostname, pid, started_at, last_heartbeat,
+                    tasks_done, tasks_failed, busy_seconds
+                from workers
+                order by started_at;
+            ''').fetchall()
+
+        workers = []
+        for worker_id, hostname, pid, started_at, last_heartbeat, done, failed, busy in rows:
+            uptime = max(last_heartbeat - started_at, 1)
+            workers.append({
+                'worker_id': worker_id,
+                'hostname': hostname,
+                'pid': pid,
+                'uptime_seconds': uptime,
+                'seconds_since_heartbeat': now - last_heartbeat,
+                'tasks_done': done,
+                'tasks_failed': failed,
+                'busy_seconds': busy,
+                'tasks_per_hour': done / uptime * 3600
+            })
+
+        return {'tasks': tasks, 'workers': workers}
+
+
+class Worker:
+    """
+    Claims tasks from a WorkQueue and runs them with a Client until the queue is
+    empty (or forever, if poll_interval is set). SIGTERM and SIGINT stop it after
+    the current task.
+    """
+    def __init__(
+            self,
+            queue: WorkQueue,
+            db_file: str = 'database.db',
+            heartbeat_interval: float = 60,
+            worker_id: str = None,
+            **client_kwargs
+        ):
+        """
+        Args:
+            queue: Where the tasks come from.
+            db_file: The SQLite database that the results go into.
+            heartbeat_interval: Seconds between two heartbeats. Should be well
+                under the queue's lease_seconds.
+            worker_id: Defaults to hostname-pid-random.
+            **client_kwargs: Passed on to the Client (e.g. proxy_pool).
+        """
+        self.queue: WorkQueue = queue
+        self.client: Client = Client(db_file, reuse_sessions=True, **client_kwargs)
+        self.heartbeat_interval: float = heartbeat_interval
+        self.worker_id: str = worker_id or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self.stop_event = threading.Event()
+
+    def run(self, poll_interval: float = None) -> None:
+        """
+        Args:
+            poll_interval: If set, wait this many seconds and look again when the
+                queue is empty instead of returning.
+        """
+        self._install_signal_handlers()
+        self.queue.register_worker(self.worker_id)
+        logger.info(f'Worker {self.worker_id} started')
+
+        try:
+            while not self.stop_event.is_set():
+                task = self.queue.claim(self.worker_id)
+
+                if task is None:
+                    if poll_interval is None:
+                        logger.info('The queue is empty')
+                        break
+                    self.stop_event.wait(poll_interval)
+                    continue
+
+                self.run_task(task)
+
+        finally:
+            self.client.close()
+            logger.info(f'Worker {self.worker_id} stopped')
+
+    def run_task(self, task: Task) -> None:
+        """ Run one task while a background thread keeps its lease alive. """
+        logger.info(f'{self.worker_id} claimed {task} (attempt {task.attempts})')
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(task, done), daemon=True)
+        heartbeat.start()
+
+        try:
+            job_id = self.client.run(
+                task.location,
+                task.category,
+                bot_type=task.bot_type,
+                before_commit=lambda: self._check_lease(task)
+            )
+
+        except Exception as e:
+            logger.exception(e)
+            self.queue.fail(task, self.worker_id, error=repr(e))
+
+        else:
+            self.queue.complete(task, self.worker_id, job_id=job_id)
+
+        finally:
+            done.set()
+            heartbeat.join()
+
+    def stop(self, *_) -> None:
+        logger.info('Received stop signal. Stopping after the current task')
+        self.stop_event.set()
+
+    def _check_lease(self, task: Task) -> None:
+        """ Renew the lease right before the job is committed, or raise if it was lost. """
+        if not self.queue.heartbeat(task.id, self.worker_id):
+            raise LeaseLostError(f'{self.worker_id} lost the lease on {task}. Not storing its job')
+
+    def _heartbeat(self, task: Task, done: threading.Event) -> None:
+        while not done.wait(self.heartbeat_interval):
+            if not self.queue.heartbeat(task.id, self.worker_id):
+                logger.warning(f'Lost the lease on {task}')
+                return
+
+    def _install_signal_handlers(self) -> None:
+        """ Signal handlers can only be set from the main thread. """
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+
+def run_workers(
+        queue_path: str,
+        db_file: str = 'database.db',
+        processes: int = 1,
+        poll_interval: float = None,
+        **client_kwargs
+    ) -> None:
+    """
+    Run one or more Worker processes on this machine and wait for them.
+
+    Args:
+        queue_path: The SQLite file of the WorkQueue.
+        db_file: The SQLite database that the results go into.
+        processes: How many worker processes to start.
+        poll_interval: See Worker.run().
+        **client_kwargs: Passed on to the Client of every worker.
+    """
+    if processes == 1:
+        Worker(WorkQueue(queue_path), db_file, **client_kwargs).run(poll_interval)
+        return
+
+    workers = [
+        multiprocessing.Process(
+            target=run_workers,
+            args=(queue_path, db_file, 1, poll_interval),
+            kwargs=client_kwargs
+        )
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    # The workers stop themselves on SIGTERM/SIGINT, so just pass the signal on.
+    def forward(signum: int, _) -> None:
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    for worker in workers:
+        worker.join()
@@ -1,36 +1,13 @@
-import sqlite3
-import contextlib
 import pathlib
 
+from craigslist_scraper.db_manager import DBHandler
+
 JOB_ID: int = 1
 DATABASE_FILE: str = 'database.db'
+UNIQUE_GIGS: bool = False           # Count reposts of the same gig once (see gig_clusters)
 
 assert pathlib.Path(DATABASE_FILE).exists(), 'Incorrect database file.'
 
-query = '''
-    select sum(
-            case
-                when comp_estimate > 20000 then 0
-                when comp_estimate > 1000 then comp_estimate / 40
-                when comp_estimate > 200 then comp_estimate / 8
-                else comp_estimate
-            end
-        ) as total_estimate_per_hour,
-        sum(
-            case
-                when comp_estimate > 20000 then 0
-                when comp_estimate > 1000 then 40
-                when comp_estimate > 200 then 8
-                else 1
-            end
-        ) as total_hours
-    from gig_data
-    inner join jobs on jobs.id=gig_data.job_id
-    where jobs.id = :job_id;
-'''
-
-with(contextlib.closing(sqlite3.connect(DATABASE_FILE))) as conn:
-    with conn:
-        total, hours = conn.execute(query, {'job_id': JOB_ID}).fetchone()
+total, hours = DBHandler(DATABASE_FILE).estimate_total_comp(JOB_ID, unique=UNIQUE_GIGS)
 
 print(f'If you worked 8 hours a day you could make around {(total / hours) * 8:.2f} dollars.')
\ No newline at end of file
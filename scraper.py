@@ -1,6 +1,291 @@
+import argparse
+
 from craigslist_scraper import Client
+from craigslist_scraper.logger import configure_logger
+from craigslist_scraper.proxy_pool import ProxyPool
+from craigslist_scraper.search import Search
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Scrape Craigslist Gigs.')
+    parser.add_argument('--db', default='database.db', help='SQLite database file')
+    parser.add_argument('--location', action='append', help='Craigslist location (repeatable)')
+    parser.add_argument('--category', action='append', help='Craigslist search path (repeatable)')
+    parser.add_argument(
+        '--search',
+        action='append',
+        help="Search path with filters, e.g. 'ggg?is_paid=no' (repeatable). All searches share one API session"
+    )
+    parser.add_argument('--hedge-after', type=float, help='Start the next bot in parallel after this many seconds')
+    parser.add_argument('--prometheus-file', help='Also write the job metrics to this .prom file')
+    parser.add_argument('--proxies', help='File with one proxy url per line to send the requests through')
+    parser.add_argument('--archive-dir', help='Archive the raw API responses in this directory')
+    parser.add_argument(
+        '--profile',
+        choices=['cprofile', 'sampling'],
+        help='Profile every run and write the profile and the top allocations next to the log file'
+    )
+    parser.add_argument('--enrich', action='store_true', help='Fetch the posting pages of new and changed gigs')
+    parser.add_argument('--detail-workers', type=int, default=4, help='Posting pages to fetch at the same time')
+    parser.add_argument('--detail-url', help='Url template of a posting page, with {location}, {search_path} and {gig_id}')
+
+    daemon = parser.add_argument_group('daemon mode')
+    daemon.add_argument('--daemon', action='store_true', help='Keep running and scrape on a schedule')
+    daemon.add_argument('--interval', type=float, default=3600, help='Seconds between runs of a job')
+    daemon.add_argument('--jitter', type=float, default=300, help='Random +/- seconds added to the interval')
+
+    logs = parser.add_argument_group('logging')
+    logs.add_argument('--log-queue', action='store_true', help='Log from a background thread (default in daemon mode)')
+    logs.add_argument('--log-json', action='store_true', help='Write the log file as JSON lines')
+    logs.add_argument('--log-max-bytes', type=int, help='Rotate the log file at this size')
+    logs.add_argument('--log-when', help="Rotate the log file on a schedule, e.g. 'midnight' (default in daemon mode)")
+    logs.add_argument('--log-backups', type=int, default=7, help='Rotated log files to keep')
+
+    commands = parser.add_subparsers(dest='command', help='Run once (the default) or use one of these')
+
+    queue = commands.add_parser('queue', help='Work queue for running scraping tasks on many processes/machines')
+    queue.add_argument('--queue-db', default='queue.db', help='SQLite file of the work queue')
+    queue_commands = queue.add_subparsers(dest='queue_command', required=True)
+
+    enqueue = queue_commands.add_parser('enqueue', help='Add a task per --location and --category')
+    enqueue.add_argument('--bot', choices=['api', 'html', 'selenium'], help='Force a bot for these tasks')
+
+    work = queue_commands.add_parser('work', help='Run tasks until the queue is empty')
+    work.add_argument('--processes', type=int, default=1, help='Worker processes to start')
+    work.add_argument('--poll-interval', type=float, help='Keep waiting for new tasks, checking this often')
+
+    queue_commands.add_parser('status', help='Show the tasks and the throughput of every worker')
+
+    reparse = commands.add_parser('reparse', help='Rebuild gig_data from the archived API responses (offline)')
+    reparse.add_argument('--jobs', type=int, nargs='+', help='Only rebuild these job ids')
+    reparse.add_argument('--workers', type=int, help='Parser processes (default: one per CPU)')
+
+    changes = commands.add_parser('changes', help='Show the new, removed and changed gigs since the previous job')
+    changes.add_argument('--job', type=int, help='Job id (default: the latest job of every --location and --category)')
+
+    search = commands.add_parser('search', help='Full-text search over the scraped gigs')
+    search.add_argument('query', nargs='?', help='Words to look for (a phrase unless --raw)')
+    search.add_argument('--raw', action='store_true', help='Use FTS5 query syntax (AND, OR, NOT, prefix*, title:...)')
+    search.add_argument('--jobs', type=int, nargs=2, metavar=('FIRST', 'LAST'), help='Only gigs of this range of job ids')
+    search.add_argument('--min-comp', type=float, help='Only gigs with at least this comp estimate')
+    search.add_argument('--max-comp', type=float, help='Only gigs with at most this comp estimate')
+    search.add_argument('--limit', type=int, default=50, help='Max number of results')
+    search.add_argument('--rebuild', action='store_true', help='Rebuild the search index from gig_data')
+
+    dedupe = commands.add_parser('dedupe', help='Count the unique gigs (near-duplicate reposts counted once)')
+    dedupe.add_argument('--job', type=int, help='Job id (default: the latest job of every --location and --category)')
+    dedupe.add_argument('--rebuild', action='store_true', help='Cluster every gig in the database again')
+
+    near = commands.add_parser('near', help='Find gigs within a radius of a point')
+    near.add_argument('latitude', type=float)
+    near.add_argument('longitude', type=float)
+    near.add_argument('--miles', type=float, default=10, help='Radius in miles')
+    near.add_argument('--jobs', type=int, nargs=2, metavar=('FIRST', 'LAST'), help='Only gigs of this range of job ids')
+    near.add_argument('--min-comp', type=float, help='Only gigs with at least this comp estimate')
+    near.add_argument('--max-comp', type=float, help='Only gigs with at most this comp estimate')
+    near.add_argument('--limit', type=int, default=50, help='Max number of results')
+
+    return parser.parse_args()
+
+
+def changes_command(args: argparse.Namespace, locations: list[str], searches: list[Search]) -> None:
+    from craigslist_scraper.db_manager import DBHandler
+
+    db = DBHandler(args.db)
+    job_ids = [args.job] if args.job else [
+        db.get_latest_job_id(location, search.search_path, search.filter_string)
+        for location in locations
+        for search in searches
+    ]
+
+    for job_id in filter(None, job_ids):
+        changes = db.get_changes(job_id)
+        if not changes:
+            print(f'Job {job_id}: no changes')
+            continue
+
+        print(f'Job {job_id} (since job {changes[0]["previous_job_id"]}): {len(changes)} changes')
+        for change in changes:
+            old, new = change['old_comp_estimate'], change['new_comp_estimate']
+            estimate = f'{old} -> {new}' if change['change'] == 'changed' else (new if old is None else old)
+            print(f'  {change["change"]:<8} {change["gig_id"]:<12} {estimate!s:<14} {change["title"]}')
+
+
+def queue_command(
+        args: argparse.Namespace,
+        locations: list[str],
+        categories: list[str],
+        client_kwargs: dict
+    ) -> None:
+    from craigslist_scraper.work_queue import WorkQueue, run_workers
+
+    queue = WorkQueue(args.queue_db)
+
+    if args.queue_command == 'enqueue':
+        for location in locations:
+            for category in categories:
+                task_id = queue.enqueue(location, category, bot_type=args.bot)
+                print(f'Enqueued task {task_id}: {location}/{category}')
+
+    elif args.queue_command == 'work':
+        run_workers(
+            args.queue_db,
+            db_file=args.db,
+            processes=args.processes,
+            poll_interval=args.poll_interval,
+            **client_kwargs
+        )
+
+    elif args.queue_command == 'status':
+        status = queue.status()
+        print('Tasks: ' + ', '.join(f'{name} = {count}' for name, count in sorted(status['tasks'].items())))
+        print(f'{"worker":<40} {"done":>6} {"failed":>6} {"tasks/h":>8} {"busy %":>7} {"last seen":>10}')
+        for worker in status['workers']:
+            busy = 100 * worker['busy_seconds'] / worker['uptime_seconds']
+            print(
+                f'{worker["worker_id"]:<40} {worker["tasks_done"]:>6} {worker["tasks_failed"]:>6} '
+                f'{worker["tasks_per_hour"]:>8.1f} {busy:>7.1f} {worker["seconds_since_heartbeat"]:>9.0f}s'
+            )
+
+
+def search_command(args: argparse.Namespace) -> None:
+    from craigslist_scraper.db_manager import DBHandler
+
+    db = DBHandler(args.db)
+
+    if args.rebuild:
+        db.rebuild_search_index()
+    if not args.query:
+        return
+
+    first_job, last_job = args.jobs or (None, None)
+    gigs = db.search_gigs(
+        args.query,
+        min_job_id=first_job,
+        max_job_id=last_job,
+        min_comp=args.min_comp,
+        max_comp=args.max_comp,
+        raw=args.raw,
+        limit=args.limit
+    )
+
+    for gig in gigs:
+        print(f'{gig["job_id"]:<6} {gig["gig_id"]:<12} {gig["comp_estimate"]!s:<8} {gig["title"]} | {gig["comp_message"]}')
+
+
+def dedupe_command(args: argparse.Namespace, locations: list[str], searches: list[Search]) -> None:
+    from craigslist_scraper.db_manager import DBHandler
+
+    db = DBHandler(args.db)
+
+    if args.rebuild:
+        db.rebuild_clusters()
+
+    job_ids = [args.job] if args.job else [
+        db.get_latest_job_id(location, search.search_path, search.filter_string)
+        for location in locations
+        for search in searches
+    ]
+
+    for job_id in filter(None, job_ids):
+        gigs, unique = db.count_unique_gigs(job_id)
+        print(f'Job {job_id}: {gigs} gigs, {unique} unique')
+
+
+def near_command(args: argparse.Namespace) -> None:
+    from craigslist_scraper.db_manager import DBHandler
+
+    first_job, last_job = args.jobs or (None, None)
+    gigs = DBHandler(args.db).find_gigs_near(
+        args.latitude,
+        args.longitude,
+        args.miles,
+        min_job_id=first_job,
+        max_job_id=last_job,
+        min_comp=args.min_comp,
+        max_comp=args.max_comp,
+        limit=args.limit
+    )
+
+    for gig in gigs:
+        print(f'{gig["job_id"]:<6} {gig["gig_id"]:<12} {gig["miles"]:>6.1f} mi {gig["comp_estimate"]!s:<8} {gig["title"]}')
 
 
 if __name__ == '__main__':
-    bot = Client()
-    bot.run()
\ No newline at end of file
+    args = parse_args()
+    locations = args.location or ['boston']
+    categories = args.category or ['ggg']
+    searches = [Search.from_string(search) for search in args.search] if args.search else None
+
+    configure_logger(
+        use_queue=args.log_queue or args.daemon,
+        json_lines=args.log_json,
+        max_bytes=args.log_max_bytes,
+        when=args.log_when or ('midnight' if args.daemon and not args.log_max_bytes else None),
+        backup_count=args.log_backups
+    )
+
+    client_kwargs = {
+        'hedge_after': args.hedge_after,
+        'prometheus_file': args.prometheus_file,
+        'proxy_pool': ProxyPool.from_file(args.proxies) if args.proxies else None,
+        'archive_dir': args.archive_dir,
+        'profile': args.profile,
+        'enrich_details': args.enrich,
+        'detail_workers': args.detail_workers,
+        'detail_url': args.detail_url
+    }
+
+    if args.command == 'queue':
+        queue_command(args, locations, categories, client_kwargs)
+
+    elif args.command == 'changes':
+        changes_command(args, locations, searches or [Search(category) for category in categories])
+
+    elif args.command == 'search':
+        search_command(args)
+
+    elif args.command == 'dedupe':
+        dedupe_command(args, locations, searches or [Search(category) for category in categories])
+
+    elif args.command == 'near':
+        near_command(args)
+
+    elif args.command == 'reparse':
+        from craigslist_scraper.archive import ResponseArchive, reparse_archive
+        from craigslist_scraper.db_manager import DBHandler
+
+        reparse_archive(
+            DBHandler(args.db),
+            ResponseArchive(args.archive_dir or 'archive'),
+            job_ids=args.jobs,
+            workers=args.workers
+        )
+
+    elif args.daemon:
+        from craigslist_scraper.scheduler import Scheduler, ScheduledJob
+
+        if searches:
+            # Every location scrapes all of its searches with one API session, like without --daemon
+            jobs = [
+                ScheduledJob(location, searches=searches, interval=args.interval, jitter=args.jitter)
+                for location in locations
+            ]
+        else:
+            jobs = [
+                ScheduledJob(location, category, interval=args.interval, jitter=args.jitter)
+                for location in locations
+                for category in categories
+            ]
+        Scheduler(jobs, db_file=args.db, **client_kwargs).run_forever()
+
+    elif searches:
+        bot = Client(args.db, **client_kwargs)
+        for location in locations:
+            bot.run_searches(location, searches)
+
+    else:
+        bot = Client(args.db, **client_kwargs)
+        for location in locations:
+            for category in categories:
+                bot.run(location=location, category=category)